@@ -167,6 +167,72 @@ def getNDUAllSeq(seq,mp=None):
       
   return  NDUs
   
+#------------------------------------------------------------------------------
+# Encode a DNA sequence once for the vectorized functions below
+# Inputs: seq = DNA sequence
+# Output: code = np.uint8 array, G=0, C=1, A=2 and any other character 3 (the
+# rows of getCongruenceMatrix)
+#------------------------------------------------------------------------------
+CODE_TABLE=np.full(256, 3, dtype=np.uint8)
+CODE_TABLE[ord('G')]=0
+CODE_TABLE[ord('C')]=1
+CODE_TABLE[ord('A')]=2
+
+def encodeSeq(seq):
+ return CODE_TABLE[np.frombuffer(seq.encode('ascii', 'replace'), dtype=np.uint8)]
+
+#------------------------------------------------------------------------------
+# Get congruene derivative matrix of an encoded sequence for periodicity p,
+# the same as getCongruenceMatrix(seq,p) with one np.bincount
+# Inputs: code = encodeSeq(seq), p = periodicity
+# Output: CM = congruence derivative matrix of sequence for periodicity p
+#------------------------------------------------------------------------------
+def getCongruenceMatrixCode(code,p):
+ n=len(code)
+ m=np.arange(n)%p
+ CM=np.bincount(code.astype(np.int64)*p+m, minlength=4*p).reshape(4, p)
+
+ return CM
+
+#------------------------------------------------------------------------------
+# Get the NDU of an encoded sequence for the periodicities 2 to mp-1, vectorized
+# Inputs: code = encodeSeq(seq), mp: the limit of periodicity range to get the NDU
+# Output: array of the NDUs, NDUs[0] is zero for periodicity 1
+# Note: the squared deviations are summed in the order of the loops of getNDUSeq
+# (np.cumsum is sequential), so the values are identical to getNDUSeq.
+#------------------------------------------------------------------------------
+def getNDUAllCode(code,mp):
+  n=len(code)
+  NDUs=np.zeros(max(mp-1, 1))
+
+  for p in range(2,mp):
+      f=getCongruenceMatrixCode(code,p)
+      avg=n/(4*p)
+      DU=np.cumsum(((f-avg)**2).ravel())[-1]
+      NDUs[p-1]=DU/n
+
+  return NDUs
+
+#------------------------------------------------------------------------------
+# Get the NDU for all periodicities in a sequence, the same as getNDUAllSeq(seq,mp)
+# Inputs: seq = DNA sequence, mp: the limit of periodicity range to get the NDU
+# Output: list of the NDUs for the periodicities 2-mp 
+# Note: the sequence is encoded once and each congruence matrix is one np.bincount
+# instead of a Python loop over the bases.
+#------------------------------------------------------------------------------
+def getNDUAllSeqVec(seq,mp=None):
+  lenS=len(seq)
+  
+  if mp is None: #If user does not input period limit, take half size but less than 100
+      mp=math.floor(lenS/2)
+      if mp>100:
+        mp=100
+        
+  NDUs=getNDUAllCode(encodeSeq(seq),mp).tolist()
+  NDUs[0]=0
+  
+  return  NDUs
+  
 #------------------------------------------------------------------------------
 # Get a list of NDU from periodicity p1 to p2 in a sequence
 # Inputs: seq = DNA sequence, p1~p2 is the periodicity range for the list of NDU
@@ -359,6 +425,57 @@ def getNDUWindowSeq(seq,p,W=None):
   
   return  nduWin
 
+#------------------------------------------------------------------------------
+# Get the NDU spectrum along the sliding windows of an encoded sequence, incrementally
+# Inputs: code = encodeSeq(seq), p = periodicity, W = window size
+# Output: nduWin = np.array of the NDU of each window, the same as getNDUWindowSeq
+# Note: NDU only depends on the multiset of counts of the congruence matrix, so a column
+# of position%p (instead of position-in-window%p) gives the same value. When the window
+# slides by one base, one count f leaves (sum of squares -2f+1) and one count f' enters
+# (+2f'+1). Both counts are read from cumulative counts along the residue classes, so
+# every step is O(1) and all steps are vectorized. The sums of squares are exact
+# integers, NDU=(sum of squares-W*W/(4p))/W agrees with getNDUSeq up to rounding.
+#------------------------------------------------------------------------------
+def getNDUWindowCode(code,p,W):
+  n=len(code)
+  e=n-W+1
+  if e<=0:
+      return np.zeros(0)
+  
+  M=(W-1)//p #other positions of the same residue class in a window
+  pad=(M+1)*p #zeros before the cumulative counts, for indices before the sequence
+  nPad=-(-n//p)*p
+  onehot=np.zeros((4, pad+nPad), dtype=np.int64)
+  onehot[code, pad+np.arange(n)]=1
+  #A[b,pad+j] = number of bases b at positions j'<=j with j'%p == j%p
+  A=onehot.reshape(4, -1, p).cumsum(axis=1).reshape(4, -1)
+  
+  i=np.arange(e-1) #slide from window i to window i+1
+  out=code[i]
+  f=A[out, pad+i+M*p]-A[out, pad+i]+1 #count of the leaving base in window i
+  k=i+W
+  inn=code[k]
+  g=A[inn, pad+k-p]-A[inn, pad+k-pad] #count of the entering base in window i without base i
+  
+  sumSq0=np.sum(np.bincount(code[:W].astype(np.int64)*p+np.arange(W)%p, minlength=4*p)**2)
+  sumSq=np.concatenate(([sumSq0], sumSq0+np.cumsum(2*(g-f)+2)))
+  
+  nduWin=(sumSq-W*W/(4*p))/W
+  return nduWin
+
+#------------------------------------------------------------------------------
+# Get the NDU spectrum along the sliding windows of a DNA sequence, incrementally
+# Inputs: seq = DNA sequence, p = periodicity, W = window size (5p by default)
+# Output: nduWin = NDU spectrum list for each position of the DNA sequence on the
+# sliding windows, the same as getNDUWindowSeq(seq,p,W) in O(L) instead of O(L*W)
+#------------------------------------------------------------------------------
+def getNDUWindowSeqInc(seq,p,W=None):
+  if W is None:
+     W = 5*p #if user does not provide window size, use 5 times of periodicity.
+  
+  nduWin=getNDUWindowCode(encodeSeq(seq),p,W).tolist()
+  return nduWin
+
 #------------------------------------------------------------------------------
 # Get the NDU spectrum along the sliding windows of different periodicities of a DNA sequence  
 # Inputs: seq = DNA sequence, W = window size, mp:upper limit of periodicity needed to be checked
@@ -383,3 +500,50 @@ def getNDU2DWinSeq(seq,W,mp=None): #mp: upper limit of periodicity needed to be
   return ndu2DWin  
  
 
+#------------------------------------------------------------------------------
+# Get the NDU spectrum along the sliding windows of different periodicities of an
+# encoded sequence, batched
+# Inputs: code = encodeSeq(seq), W = window size, mp: upper limit of periodicity,
+# periods: periodicities to compute (1 to mp-1 by default, the other rows stay zero),
+# filename: write the surface to this .npy file as a memory map (for long sequences)
+# Output: ndu2DWin = NDU 2D array (periods x positions), the same as getNDU2DWinSeq,
+# np.memmap if filename is given
+# Note: each row is one getNDUWindowCode (rolling counts, O(L) per period), the
+# sequence is encoded once and a memory-mapped surface never has to fit in memory
+#------------------------------------------------------------------------------
+def getNDU2DWinCode(code,W,mp,periods=None,filename=None):
+  L=max(len(code)-W+1, 0)
+  if periods is None:
+      periods=range(1,mp)
+  
+  if filename is None:
+      ndu2DWin=np.zeros((mp,L))
+  else:
+      ndu2DWin=np.lib.format.open_memmap(filename, mode='w+', dtype=float, shape=(mp,L))
+      
+  for i in periods: #i is period
+      ndu2DWin[i,:]=getNDUWindowCode(code,i,W)
+      
+  if filename is not None:
+      ndu2DWin.flush()
+  
+  return ndu2DWin
+
+#------------------------------------------------------------------------------
+# Get the NDU spectrum along the sliding windows of different periodicities of a DNA
+# sequence, the same as getNDU2DWinSeq(seq,W,mp) with rolling counts
+# Inputs: seq = DNA sequence, W = window size, mp:upper limit of periodicity needed to be checked,
+# filename: write the surface to this .npy file as a memory map
+# Output: ndu2DWin = NDU 2D array for each position of the DNA sequence on the sliding windows
+#------------------------------------------------------------------------------
+def getNDU2DWinSeqVec(seq,W,mp=None,filename=None):
+  lenS=len(seq)
+  
+  if mp is None: #If user does not input period limit, take half size but less than 100
+      mp=math.floor(lenS/2)
+      if mp>100:
+        mp=100
+  
+  ndu2DWin=getNDU2DWinCode(encodeSeq(seq),W,mp,filename=filename)
+  
+  return ndu2DWin
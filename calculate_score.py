@@ -1,14 +1,230 @@
 import numpy as np
+import pandas as pd
 import yaml
 import json
 import os
+import hashlib
 import pickle
+import time
+import fcntl
+import socket
+import io
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from Bio import SeqIO
-from Bio.SeqUtils import gc_fraction
 from Bio.Blast import NCBIXML
 import primer3 #pip install primer3-py (https://pypi.org/project/primer3-py/#files)
 import DNANDU as DU
-from sub_functions import convert_blast_pickle_to_txt, sliding_window, write_to_fasta_or_txt, my_print
+import kmer_homology as KH
+from sub_functions import convert_blast_pickle_to_txt, sliding_window, fasta_text, my_print, in_daemon_process
+
+
+
+def calcu_hairpin_dg(sequence_list):
+    # primer3 hairpin dG of each sequence (a chunk of windows for a worker of HairpinMemo)
+    return [primer3.calc_hairpin(seq).dg for seq in sequence_list]
+    
+    
+    
+BLAST_TABULAR_FIELDS = ['qseqid', 'sseqid', 'qstart', 'qend', 'sstart', 'send', 'evalue', 'score']
+#columns of -outfmt 6 in the batch mode (score: raw score, as hsp.score of the XML)
+
+
+
+def file_sha256(filename):
+    # content hash of a file (names the plasmid BLAST database)
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+    
+    
+    
+LOCK_TIMEOUT = 3600
+#seconds to wait for another worker to build the plasmid database
+    
+    
+    
+class HairpinMemo(object):
+    """
+    BOUNDED LRU MEMO OF primer3 HAIRPIN dG, KEYED BY WINDOW SEQUENCE
+    --------------------------------------------------
+    One instance (HAIRPIN_MEMO) is shared by all CalculateScore objects of a process,
+    so windows repeated within a sequence or across the sequences scored by that
+    process (adapters, codon repeats, ...) are folded once. It is not shared between
+    processes: under submain_parallel each worker of the Pool has its own memo, so
+    windows repeated across sequences are only reused within a worker, and the memo
+    of the parent stays empty. The windows missing from the memo are
+    deduplicated and folded by a pool of n_jobs workers (processes, or threads in a
+    daemonic process), then the least recently used entries beyond maxsize are dropped.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.memo = OrderedDict()
+        self.n_window = 0 #windows looked up
+        self.n_call = 0 #primer3 calls
+        self.time = 0.0 #seconds spent in calcu
+        
+        
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while len(self.memo) > self.maxsize:
+            self.memo.popitem(last=False)
+            
+            
+    def calcu(self, sequence_list, n_jobs=1):
+        """
+        INPUTS:
+        -- sequence_list [list]: window sequences
+        -- n_jobs [int]: number of workers for the windows missing from the memo, -1 for all cores
+        
+        OUTPUTS:
+        -- dg [np.array]: hairpin dG of each window
+        -- stats [dict]: statistics of this call, see stats
+        """
+        t_start = time.time()
+        
+        dg_dict = dict()
+        for seq in sequence_list:
+            if seq in self.memo:
+                self.memo.move_to_end(seq)
+                dg_dict[seq] = self.memo[seq]
+        missing_list = list(dict.fromkeys(seq for seq in sequence_list if seq not in dg_dict))
+        
+        if n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs > 1 and len(missing_list) > n_jobs:
+            chunk_size = int(np.ceil(len(missing_list) / (4 * n_jobs)))
+            chunk_list = [missing_list[i: i+chunk_size] for i in range(0, len(missing_list), chunk_size)]
+            pool = ThreadPoolExecutor if in_daemon_process() else ProcessPoolExecutor
+            with pool(max_workers=n_jobs) as executor:
+                missing_dg = [dg for chunk_dg in executor.map(calcu_hairpin_dg, chunk_list) for dg in chunk_dg]
+        else:
+            missing_dg = calcu_hairpin_dg(missing_list)
+            
+        for (seq, dg) in zip(missing_list, missing_dg):
+            dg_dict[seq] = dg
+            self.memo[seq] = dg
+        self.resize(self.maxsize)
+        dg = np.array([dg_dict[seq] for seq in sequence_list], dtype=float)
+        
+        t_call = time.time() - t_start
+        self.n_window += len(sequence_list)
+        self.n_call += len(missing_list)
+        self.time += t_call
+        
+        return dg, self.stats(len(sequence_list), len(missing_list), t_call)
+        
+        
+    def stats(self, n_window=None, n_call=None, t_call=None):
+        """
+        hit rate (windows not sent to primer3) and throughput, of one call of calcu
+        or, without arguments, of all calls so far
+        """
+        if n_window is None:
+            n_window, n_call, t_call = self.n_window, self.n_call, self.time
+        return {'windows': n_window,
+                'primer3_calls': n_call,
+                'hit_rate': 1 - n_call / n_window if n_window > 0 else 0.0,
+                'seconds': t_call,
+                'windows_per_second': n_window / t_call if t_call > 0 else np.inf,
+                'memo_size': len(self.memo)}
+                
+                
+HAIRPIN_MEMO = HairpinMemo()
+
+
+
+SCORE_CACHE_VERSION = 1
+#part of every cache key, increase it when a score track changes for the same parameters
+
+
+
+class ScoreCache(object):
+    """
+    CONTENT-ADDRESSED ON-DISK CACHE OF SCORE TRACKS, BOUNDED BY SIZE (LRU)
+    --------------------------------------------------
+    Each entry is one .npz file (the raw and normalized tracks of one score component)
+    named by the sha256 of everything the track depends on (see key). Reading an entry
+    touches it, and after each write the least recently used entries are removed until
+    the folder holds at most max_size bytes. Entries are written to a temporary file
+    and renamed, so parallel workers never read a partial entry.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+        
+        
+    def key(self, *part_list):
+        # sha256 of the parts (sequence, parameters, ...) of a track
+        content = json.dumps([SCORE_CACHE_VERSION] + list(part_list), sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+        
+        
+    def load(self, key):
+        """
+        OUTPUTS:
+        -- track_dict [dict]: arrays of the entry, None if it is not cached
+        """
+        filename = '{}{}.npz'.format(self.directory, key)
+        try:
+            with np.load(filename) as data:
+                track_dict = {name: data[name] for name in data.files}
+            os.utime(filename) #most recently used
+        except (OSError, ValueError, EOFError):
+            return None
+            
+        return track_dict
+        
+        
+    def contains(self, key):
+        # whether the entry is cached, touched to be kept until it is read
+        try:
+            os.utime('{}{}.npz'.format(self.directory, key))
+        except OSError:
+            return False
+        return True
+        
+        
+    def save(self, key, track_dict):
+        """
+        INPUTS:
+        -- track_dict [dict]: arrays to cache
+        """
+        filename = '{}{}.npz'.format(self.directory, key)
+        filename_tmp = '{}{}.{}.tmp'.format(self.directory, key, os.getpid())
+        with open(filename_tmp, 'wb') as f:
+            np.savez(f, **track_dict)
+        os.replace(filename_tmp, filename)
+        self.evict()
+        
+        
+    def evict(self):
+        # remove the least recently used entries beyond max_size
+        entry_list = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: #removed by another worker
+                    continue
+                entry_list.append((stat.st_mtime, stat.st_size, entry.path))
+        entry_list.sort()
+        
+        size = sum(entry[1] for entry in entry_list)
+        for (_, entry_size, path) in entry_list:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
 
 
 
@@ -30,17 +246,39 @@ class CalculateScore(object):
         self.PENALTY = param_score_dict['BLAST']['PENALTY']
         self.GAPOPEN = param_score_dict['BLAST']['GAPOPEN']
         self.GAPEXTEND = param_score_dict['BLAST']['GAPEXTEND']
+        self.BLAST_database_directory = param_score_dict['BLAST'].get('database_directory', None)
+        #persistent folder for the plasmid database, shared by runs ({output_directory}blast_result/database/ by default)
+        self.BLAST_save_result = param_score_dict['BLAST'].get('save_result', True)
+        #write the BLAST hits of each sequence to {label}_BLAST_result.pickle/.txt (diagnostics only)
         #----------
         self.hairpin_window_size = param_score_dict['Primer3']['hairpin_window_size']
         self.hairpin_threshold = param_score_dict['Primer3']['hairpin_threshold']
+        self.hairpin_memo_size = param_score_dict['Primer3'].get('hairpin_memo_size', 100000)
+        self.hairpin_jobs = param_score_dict['Primer3'].get('hairpin_jobs', 1)
+        self.hairpin_prescreen = param_score_dict['Primer3'].get('hairpin_prescreen', False)
+        self.hairpin_prescreen_k = param_score_dict['Primer3'].get('hairpin_prescreen_k', 5)
+        self.hairpin_prescreen_loop = param_score_dict['Primer3'].get('hairpin_prescreen_loop', 3)
+        #only windows with an inverted repeat (stem of k bp around a loop of >= loop bp) go to primer3
+        self.hairpin_stride = param_score_dict['Primer3'].get('hairpin_stride', 1)
+        #fold every stride-th window and interpolate, windows next to a sample above threshold are folded exactly
         #----------
         self.NDU_repeat_window_size = param_score_dict['NDU']['NDU_repeat_window_size']
         self.NDU_threshold = param_score_dict['NDU']['NDU_threshold']
+        self.NDU_surface = param_score_dict['NDU'].get('NDU_surface', False)
+        self.NDU_surface_memmap = param_score_dict['NDU'].get('NDU_surface_memmap', False)
+        #keep the full NDU surface (periods x positions) for diagnostics, in memory or in a
+        #np.memmap of {output_directory}ndu_surface/ (otherwise only the periods above threshold are computed)
         #---------- this option is currently not added yet
         self.MFE_window_size = param_score_dict['MFE']['MFE_window_size']
         self.MFE_skip = param_score_dict['MFE']['MFE_skip']
         self.MFE_offset = param_score_dict['MFE']['MFE_offset']
         self.MFE_threshold = param_score_dict['MFE']['MFE_threshold']
+        #----------
+        param_cache_dict = param_score_dict.get('Cache', dict())
+        self.use_cache = param_cache_dict.get('use_cache', True)
+        self.cache_directory = param_cache_dict.get('cache_directory', None)
+        self.cache_max_size = param_cache_dict.get('cache_max_size', 1024)
+        #score tracks cached in cache_directory ({output_directory}score_cache/ by default), at most cache_max_size MB
 
         
         self.recipient_plasmid_ends_file = param_dict['recipient_plasmid_ends_file']
@@ -58,14 +296,19 @@ class CalculateScore(object):
         else:
             self.use_GC = False
             
-        if 'BLAST' in score_option: #BLAST
+        if 'BLAST_KMER' in score_option: #homology by the built-in k-mer search (kmer_homology) instead of blastn
+            self.blast_backend = 'kmer'
+        else:
+            self.blast_backend = 'blastn'
+            
+        if 'BLAST' in score_option: #BLAST (or BLAST_KMER)
             self.use_BLAST = True
             self.dir_blast = '{}blast_result/'.format(self.dir_output)
             #folder for BLAST result
             self.dir_blast_database = '{}database/'.format(self.dir_blast)
             #folder for database in BLAST
-            self.dir_blast_tmp = '{}tmp/'.format(self.dir_blast)
-            #folder for temporary in BLAST
+            if self.BLAST_database_directory is not None:
+                self.dir_blast_database = os.path.join(self.BLAST_database_directory, '')
         else:
             self.use_BLAST = False
             
@@ -88,6 +331,24 @@ class CalculateScore(object):
         self.label = label
         self.parallel = json.loads(param_dict['parallel'].lower())
         
+        if self.use_cache:
+            if self.cache_directory is None:
+                self.cache_directory = '{}score_cache/'.format(self.dir_output)
+            self.score_cache = ScoreCache(os.path.join(self.cache_directory, ''), self.cache_max_size * 2**20)
+            #what each track depends on, options that only change speed or outputs are left out
+            self.cache_param_dict = {
+                'gc': param_score_dict['GC'],
+                'blast': [{key: value for (key, value) in param_score_dict['BLAST'].items()
+                           if key not in ['database_directory', 'save_result']},
+                          file_sha256(self.plasmids_file) if self.use_BLAST else None,
+                          self.blast_backend],
+                'hairpin': {key: value for (key, value) in param_score_dict['Primer3'].items()
+                            if key not in ['hairpin_memo_size', 'hairpin_jobs']},
+                'ndu': {key: value for (key, value) in param_score_dict['NDU'].items()
+                        if key not in ['NDU_surface', 'NDU_surface_memmap']}}
+        else:
+            self.score_cache = None
+        
         
         
     def calcu_gc_content(self, sequence):
@@ -98,7 +359,7 @@ class CalculateScore(object):
         -- sequence [str]: a DNA sequence
         
         OUTPUTS:
-        -- gc_contents [list]: a list of GC content
+        -- gc_contents [np.array]: GC content for each base pair
         """
         #window_size = self.GC_window_size
         #len_left = int(np.floor(window_size/2))
@@ -107,39 +368,143 @@ class CalculateScore(object):
         #sequence_slide_window = sliding_window(sequence_pad, window_size)
         #gc_score = [gc_fraction(seq)/100 for seq in sequence_slide_window]
         
+        #same as gc_fraction on each window of sliding_window: G, C and S over A, C, G, T, S, W and U,
+        #from cumulative counts over the sequence encoded once
         window_size = self.GC_window_size
-        sequence_slide_window = sliding_window(sequence, window_size)
+        sequence_array = np.frombuffer(sequence.upper().encode(), dtype=np.uint8)
+        gc_cumsum = np.concatenate(([0], np.cumsum(np.isin(sequence_array, list(b'GCS')))))
+        base_cumsum = np.concatenate(([0], np.cumsum(np.isin(sequence_array, list(b'ACGTSWU')))))
+        
+        if len(sequence) <= window_size: #a single window, as in sliding_window
+            pos_start = np.array([0])
+        else:
+            pos_start = np.arange(len(sequence) - window_size + 1)
+        pos_end = np.minimum(pos_start + window_size, len(sequence))
+        gc_count = gc_cumsum[pos_end] - gc_cumsum[pos_start]
+        base_count = base_cumsum[pos_end] - base_cumsum[pos_start]
+        gc_window = np.where(base_count > 0, gc_count / np.maximum(base_count, 1), 0)
+        
         tmp = int((window_size - 1)/2)
-        gc_content = [0]*tmp + [gc_fraction(seq) for seq in sequence_slide_window] + [0]*tmp
+        gc_content = np.concatenate((np.zeros(tmp), gc_window, np.zeros(tmp)))
         
         return gc_content
         
         
         
-    def make_blast_database(self, sequence_database):
+    def make_blast_database(self, sequence_database, db_name=None):
         """
         MAKE A DATABASE
         --------------------------------------------------
         INPUTS:
         -- sequence_database [list]: a list of DNA sequences (target DNA sequence, plasmids (donor and recipient))
+        -- db_name [str]: name of the database in dir_blast_database, label by default
+        """
+        if db_name is None:
+            db_name = self.label
+            
+        #Make a BLAST database, the sequences in fasta format on stdin
+        with open('{}log_file_{}.txt'.format(self.dir_blast_database, db_name), 'w') as log_file:
+            subprocess.run(['makeblastdb', '-in', '-', '-title', db_name, '-dbtype', 'nucl', '-input_type', 'fasta',
+                            '-hash_index', '-out', '{}{}'.format(self.dir_blast_database, db_name)],
+                           input=fasta_text(sequence_database), stdout=log_file, text=True, check=True)
+        
+        
+        
+    def make_plasmid_database(self):
+        """
+        MAKE THE DATABASE OF THE DONOR AND RECIPIENT PLASMIDS ONCE
+        --------------------------------------------------
+        The database is named by a content hash of plasmids_file, so it is built by
+        the first sequence of the first run and reused by all other sequences and runs
+        (with the same database folder) until plasmids_file changes. A marker file is
+        written when makeblastdb is done, so a database left half-built is rebuilt.
+        Parallel workers (and runs sharing database_directory, also over NFS) take an
+        exclusive fcntl.flock on the lock file in turn, the first one builds the
+        database and the others find the marker. The kernel releases the lock when
+        its process ends, even if it is killed, so the lock file itself is never
+        removed (it holds host:PID of the last builder). A worker waiting longer than
+        LOCK_TIMEOUT raises TimeoutError.
+        
+        OUTPUTS:
+        -- db_file [str]: path of the database (for blastn -db)
         """
-        #Make a fatsa file for building BLAST database
-        filename = '{}tmp_{}.fa'.format(self.dir_blast_tmp, self.label)
-        write_to_fasta_or_txt(sequence_database, filename)
+        db_name = 'plasmids_{}'.format(file_sha256(self.plasmids_file)[:16])
+        db_file = '{}{}'.format(self.dir_blast_database, db_name)
+        marker_file = '{}.done'.format(db_file)
         
-        #Make a BLAST database
-        os.system('makeblastdb -in {0}tmp_{2}.fa -title {2} -dbtype nucl -input_type fasta -hash_index -out {1}{2} > {1}log_file_{2}.txt'.format(self.dir_blast_tmp, self.dir_blast_database, self.label))
+        lock_file = '{}.lock'.format(db_file)
         
-        #remove the fatsa file that used for building BLAST database
-        os.system('rm -f {}tmp_{}.fa'.format(self.dir_blast_tmp, self.label))
+        if not os.path.exists(marker_file):
+            os.makedirs(self.dir_blast_database, exist_ok=True)
+            with open(lock_file, 'a+') as lock:
+                t_start = time.time()
+                while True:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError: #another worker is building it
+                        if time.time() - t_start > LOCK_TIMEOUT:
+                            lock.seek(0)
+                            raise TimeoutError('{} is still locked (builder: {})'.format(lock_file, lock.read().strip()))
+                        time.sleep(1)
+                
+                try:
+                    if not os.path.exists(marker_file): #not built while waiting for the lock
+                        lock.truncate(0)
+                        lock.write('{}:{}\n'.format(socket.gethostname(), os.getpid()))
+                        lock.flush()
+                        sequence_database = [str(record.seq) for record in SeqIO.parse(self.plasmids_file, 'fasta')]
+                        self.make_blast_database(sequence_database, db_name)
+                        with open(marker_file, 'w') as f:
+                            f.write('{}\n'.format(self.plasmids_file))
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                
+        return db_file
         
     
         
-    def make_blast_single(self, query):
+    def run_blastn(self, sequence_list, option_list, db_file=None, subject=None):
+        """
+        RUN blastn WITH THE QUERIES ON stdin AND THE RESULT ON stdout
+        --------------------------------------------------
+        Nothing is written to the output folder. With subject, blastn reads the
+        subject (the queries themselves) from a file, which is a temporary file of
+        the local temporary folder (tempfile), removed when blastn is done.
+        
+        INPUTS:
+        -- sequence_list [str or list]: DNA sequences, their fasta ids are their indices
+        -- option_list [list]: output options (-outfmt, ...)
+        -- db_file [str]: database to blast against (make_plasmid_database)
+        -- subject [bool]: blast the sequences against themselves instead of a database
+        
+        OUTPUTS:
+        -- output [str]: stdout of blastn
+        """
+        query = fasta_text(sequence_list)
+        command = ['blastn', '-query', '-', '-task', 'blastn-short',
+                   '-perc_identity', str(self.PERC_IDENTITY), '-evalue', str(self.EVALUE),
+                   '-word_size', str(self.WORD_SIZE), '-reward', str(self.REWARD), '-penalty', str(self.PENALTY),
+                   '-gapopen', str(self.GAPOPEN), '-gapextend', str(self.GAPEXTEND)] + option_list
+        
+        if subject:
+            with tempfile.NamedTemporaryFile('w', suffix='.fa') as subject_file:
+                subject_file.write(query)
+                subject_file.flush()
+                result = subprocess.run(command + ['-subject', subject_file.name], #-num_threads is not supported with -subject
+                                        input=query, capture_output=True, text=True, check=True)
+        else:
+            result = subprocess.run(command + ['-db', db_file, '-num_threads', '4'],
+                                    input=query, capture_output=True, text=True, check=True)
+            
+        return result.stdout
+        
+        
+        
+    def make_blast_single(self, query, db_file=None, subject=None):
         """
-        NBLASTS ONE QUERY (A DNA SEQUENCE) AGAINST A DATABASE OF ONE SEQUENCE
-        DB is the database to blast against
-        (containing the sequence in the context of the plasmid)
+        NBLASTS ONE QUERY (A DNA SEQUENCE) AGAINST A DATABASE,
+        OR AGAINST ITSELF (-subject) FOR SELF-HITS
         
         see BLAST parameters at
         https://biopython.org/docs/1.75/api/Bio.Blast.Applications.html
@@ -148,9 +513,14 @@ class CalculateScore(object):
         --------------------------------------------------
         INPUTS:
         -- query [str]: a DNA sequence to test
+        -- db_file [str]: database to blast against (make_plasmid_database)
+        -- subject [bool]: blast the query against itself instead of a database
+        
+        With the BLAST_KMER score option, the HSPs come from KH.search against the
+        query itself or the plasmids of plasmids_file (db_file is not used).
         
         OUTPUTS:
-        -- result [list]: a list of tuples
+        -- result [list]: a list of tuples, the HSPs of all hit sequences
         [[(Acession,
            Evalue,
            query start,
@@ -160,22 +530,18 @@ class CalculateScore(object):
            (query strand, target strand))],
            [ ], ...]
         """
-        
-        db_file = '{}{}'.format(self.dir_blast_database, self.label)
-        #database containing a single sequence
-        query_file =  '{}BLAST_query_file_{}.txt'.format(self.dir_blast_tmp, self.label)
-        xml_file = '{}BLAST_result_{}.xml'.format(self.dir_blast_tmp, self.label)
-        
-        #write query to a fasta file
-        write_to_fasta_or_txt(query, query_file)
-        
-        #perform BLAST
-        command = 'blastn -query {} -db {} -task blastn-short -perc_identity {} -evalue {} -word_size {} -reward {} -penalty {} -gapopen {} -gapextend {} -outfmt 5 -out {} -num_alignments 200 -num_threads 4'.format(query_file, db_file, self.PERC_IDENTITY, self.EVALUE, self.WORD_SIZE, self.REWARD, self.PENALTY, self.GAPOPEN, self.GAPEXTEND, xml_file)
-        os.system(command)
-        
-        result_xml = open(xml_file)
-        result_ncbixml = NCBIXML.read(result_xml)
-        result_hsps = result_ncbixml.alignments[0].hsps
+        if self.blast_backend == 'kmer':
+            if subject:
+                subject_list = [query]
+            else:
+                subject_list = [str(record.seq) for record in SeqIO.parse(self.plasmids_file, 'fasta')]
+            return KH.search(query, subject_list, self.WORD_SIZE, self.REWARD, self.PENALTY,
+                             self.PERC_IDENTITY, self.EVALUE)
+            
+        #perform BLAST, parse the xml output in memory
+        result_xml = self.run_blastn(query, ['-outfmt', '5', '-num_alignments', '200'], db_file, subject)
+        result_ncbixml = NCBIXML.read(io.StringIO(result_xml))
+        result_hsps = [hsp for alignment in result_ncbixml.alignments for hsp in alignment.hsps]
         result = [(result_hsps[i].score,
                    result_hsps[i].align_length,  #the length of the query sequence
                    result_hsps[i].query_start,
@@ -187,24 +553,65 @@ class CalculateScore(object):
                    result_hsps[i].match,
                    result_hsps[i].sbjct,
                    result_hsps[i].positives/result_hsps[i].align_length) for i in range(len(result_hsps))]
-       
-        os.system('rm -f {}'.format(query_file)) #remove input file
-        os.system('rm -f {}'.format(xml_file)) #remove output files
+                                                 
+        return result
         
-        #save BLAST result to both pickle and txt files
-        with open('{}{}_BLAST_result.pickle'.format(self.dir_blast, self.label), 'wb') as f:
-            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
         
-        convert_blast_pickle_to_txt('{}{}_BLAST_result.pickle'.format(self.dir_blast, self.label),
-                                    '{}{}_BLAST_result.txt'.format(self.dir_blast, self.label))
-                                                 
+        
+    def make_blast_batch(self, sequence_list, db_file=None, subject=None):
+        """
+        NBLASTS ALL SEQUENCES OF AN EXPERIMENT IN ONE blastn CALL
+        (MULTI-FASTA QUERY, TABULAR OUTPUT -outfmt 6)
+        --------------------------------------------------
+        INPUTS:
+        -- sequence_list [list]: DNA sequences, their fasta ids are their indices
+        -- db_file [str]: database to blast against (make_plasmid_database)
+        -- subject [bool]: blast the sequences against themselves instead of a database
+        (all against all, so calcu_blast_score passes one sequence for its self-hits)
+        
+        OUTPUTS:
+        -- result [pd.DataFrame]: one row per HSP, columns BLAST_TABULAR_FIELDS,
+           qseqid and sseqid are indices in sequence_list (str)
+        """
+        #perform BLAST
+        result_tab = self.run_blastn(sequence_list, ['-outfmt', '6 {}'.format(' '.join(BLAST_TABULAR_FIELDS)),
+                                                     '-max_target_seqs', '200'], db_file, subject)
+        
+        #one vectorized read of all hits
+        if len(result_tab.strip()) > 0:
+            result = pd.read_csv(io.StringIO(result_tab), sep='\t', header=None, names=BLAST_TABULAR_FIELDS,
+                                 dtype={'qseqid': str, 'sseqid': str})
+        else:
+            result = pd.DataFrame(columns=BLAST_TABULAR_FIELDS)
+        
         return result
     
     
     
-    def calcu_blast_score(self, sequence):
+    def blast_track(self, score_list, start_list, end_list, length):
+        """
+        convert BLAST hits (score, query start, query end, index started from 1) to a track,
+        a later hit overwrites an earlier one
+        """
+        blast_score = np.zeros(length)
+        for (score, pos_start, pos_end) in zip(score_list, start_list, end_list):
+            blast_score[pos_start-1:pos_end] = score
+            
+        return blast_score
+        
+        
+        
+    def calcu_blast_score(self, sequence, blast_hits=None):
         """
         Calculating BLAST matches to self, donor plasmids, and recipient plasmids
+        
+        Self-hits come from blasting the sequence against itself (no database), the
+        trivial self-identity (same query and target position) is removed. Hits to the
+        plasmids come from the plasmid database, built once by make_plasmid_database.
+        
+        blast_hits [pd.DataFrame]: plasmid hits of this sequence from blast_batch,
+        instead of blasting it against the database here (the self-hits are still
+        blasted here, in the same tabular format)
         """
         #sequence_database = [sequence] + [str(record.seq) for record in SeqIO.parse(self.plasmids_file, 'fasta')]
         #self.make_blast_database(sequence_database)
@@ -219,28 +626,170 @@ class CalculateScore(object):
         #    pos_end = max(blast_result[k][2], blast_result[k][3]) - 1 #is it possible the other way? index started from 1
         #    blast_score[pos_start:pos_end+1] = [blast_result[k][0]] * (pos_end - pos_start + 1)
             
+        if blast_hits is not None:
+            self_hits = self.make_blast_batch([sequence], subject=True)
+            self_hits = self_hits[~((self_hits['qstart'] == self_hits['sstart']) & (self_hits['qend'] == self_hits['send']))]
+            #remove self-identity
+            blast_hits = (self_hits, blast_hits)
             
-        sequence_database = [sequence] + [str(record.seq) for record in SeqIO.parse(self.plasmids_file, 'fasta')]
-        self.make_blast_database(sequence_database)
-        
-        blast_result = self.make_blast_single(sequence)
-        blast_result.pop(0) #remove self-identity (i.e., the first one).
-        
-        #convert BLAST result to track
-        blast_score = [0] * len(sequence)
-        if len(blast_result) > 0:
-            for k in range(len(blast_result)):
-                pos_start = blast_result[k][2] - 1 #index started from 1
-                pos_end = blast_result[k][3] - 1 #index started from 1
-                blast_score[pos_start:pos_end+1] = [blast_result[k][0]] * (pos_end - pos_start + 1)
+            #save BLAST result of the batch to a txt (tab-separated) file
+            if self.BLAST_save_result:
+                pd.concat(blast_hits, keys=['self', 'plasmid']).to_csv(
+                    '{}{}_BLAST_result.txt'.format(self.dir_blast, self.label), sep='\t')
+            
+            #convert BLAST result to track, each of self-hits and plasmid hits, keep the larger one
+            blast_score = np.zeros(len(sequence))
+            for result in blast_hits:
+                blast_score = np.maximum(blast_score, self.blast_track(result['score'], result['qstart'],
+                                                                       result['qend'], len(sequence)))
+                
+            return blast_score
+            
+        self_result = self.make_blast_single(sequence, subject=True)
+        self_result = [hit for hit in self_result if (hit[2], hit[3]) != (hit[4], hit[5])]
+        #remove self-identity
+        
+        if self.blast_backend == 'blastn':
+            plasmid_result = self.make_blast_single(sequence, db_file=self.make_plasmid_database())
+        else:
+            plasmid_result = self.make_blast_single(sequence)
+        
+        blast_result = self_result + plasmid_result
+        
+        #save BLAST result to both pickle and txt files
+        if self.BLAST_save_result:
+            with open('{}{}_BLAST_result.pickle'.format(self.dir_blast, self.label), 'wb') as f:
+                pickle.dump(blast_result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            
+            convert_blast_pickle_to_txt('{}{}_BLAST_result.pickle'.format(self.dir_blast, self.label),
+                                        '{}{}_BLAST_result.txt'.format(self.dir_blast, self.label))
+        
+        #convert BLAST result to track, each of self-hits and plasmid hits, keep the larger one
+        blast_score = np.zeros(len(sequence))
+        for result in [self_result, plasmid_result]:
+            blast_score = np.maximum(blast_score, self.blast_track([hit[0] for hit in result],
+                                                                   [hit[2] for hit in result],
+                                                                   [hit[3] for hit in result],
+                                                                   len(sequence)))
             
         return blast_score
         
     
     
-    def calcu_hairpin_score(self, sequence): #seems wrong tool for calculating hairpin!!!
+    def find_inverted_repeat(self, sequence):
+        """
+        FLAG THE HAIRPIN WINDOWS THAT CONTAIN AN INVERTED REPEAT
+        --------------------------------------------------
+        A seed is a k-mer at q whose reverse complement also starts at some p <= q - k - loop
+        (a stem of k bp around a loop of at least loop bp). The k-mers are hashed once
+        (2 bits per base), the reverse-complement hashes are indexed sorted by (hash, p),
+        and the closest p of each q is one searchsorted. Window i contains the seed iff
+        q + k - window_size <= i <= p.
+        
+        INPUTS:
+        -- sequence [str]: a DNA sequence
+        
+        OUTPUTS:
+        -- flag [np.array]: bool for each window of sliding_window(sequence, hairpin_window_size)
+        """
+        k, loop = self.hairpin_prescreen_k, self.hairpin_prescreen_loop
+        L = len(sequence)
+        window_size = min(self.hairpin_window_size, L) #a single window if L <= window size
+        n_window = L - window_size + 1
+        flag_diff = np.zeros(n_window + 1, dtype=np.int64)
+        if L < k:
+            return flag_diff[:n_window] > 0
+        
+        #A, C, G, T/U -> 0, 1, 2, 3, other bases -> 4 (never part of a seed)
+        code_table = np.full(256, 4, dtype=np.int64)
+        for (base, code) in zip(b'ACGTU', [0, 1, 2, 3, 3]):
+            code_table[base] = code
+        base_array = code_table[np.frombuffer(sequence.upper().encode(), dtype=np.uint8)]
+        
+        kmer_array = np.lib.stride_tricks.sliding_window_view(base_array, k)
+        valid = (kmer_array < 4).all(axis=1)
+        weight = 4 ** np.arange(k-1, -1, -1)
+        kmer_hash = kmer_array @ weight
+        rc_hash = (3 - kmer_array[:, ::-1]) @ weight
+        
+        n_kmer = L - k + 1
+        pos = np.arange(n_kmer)
+        rc_index = np.sort(rc_hash[valid] * n_kmer + pos[valid])
+        
+        pos_q = pos[valid & (pos >= k + loop)]
+        idx = np.searchsorted(rc_index, kmer_hash[pos_q] * n_kmer + pos_q - k - loop, side='right') - 1
+        found = (idx >= 0) & (rc_index[np.maximum(idx, 0)] // n_kmer == kmer_hash[pos_q])
+        pos_q, pos_p = pos_q[found], rc_index[idx[found]] % n_kmer
+        
+        window_low = np.maximum(pos_q + k - window_size, 0)
+        window_high = np.minimum(pos_p, n_window - 1)
+        keep = window_low <= window_high
+        np.add.at(flag_diff, window_low[keep], 1)
+        np.add.at(flag_diff, window_high[keep] + 1, -1)
+        
+        return np.cumsum(flag_diff)[:n_window] > 0
+        
+        
+        
+    def calcu_hairpin_dg_strided(self, window_list, stride):
+        """
+        HAIRPIN dG SAMPLED ON A STRIDE, REFINED WHERE IT MATTERS
+        --------------------------------------------------
+        Every stride-th window (and the last one) is folded, the windows in between are
+        linearly interpolated. Every gap between two samples of which at least one has a
+        score (-dG) above hairpin_threshold, i.e. where the threshold is crossed or the
+        normalized score is non-zero, is then folded exactly, so the interpolated windows
+        all have a normalized hairpin score of 0 on both sides. A narrow hairpin lying
+        entirely between two samples below threshold can be missed.
+        
+        INPUTS:
+        -- window_list [list]: window sequences
+        -- stride [int]: distance between sampled windows
+        
+        OUTPUTS:
+        -- hairpin_dg [np.array]: hairpin dG of each window
+        -- stats [dict]: statistics of the memo calls (see HairpinMemo.stats) and 'interpolated',
+           the number of windows that were not folded
         """
+        n_window = len(window_list)
+        sample = np.unique(np.append(np.arange(0, n_window, stride), n_window - 1))
+        sample_dg, stats_sample = HAIRPIN_MEMO.calcu([window_list[i] for i in sample], self.hairpin_jobs)
+        hairpin_dg = np.interp(np.arange(n_window), sample, sample_dg)
+        
+        #gaps (sample[i], sample[i+1]) with a sample above threshold are refined
+        above = -sample_dg > self.hairpin_threshold
+        refine = np.flatnonzero(above[:-1] | above[1:])
+        exact = np.zeros(n_window, dtype=bool)
+        exact[sample] = True
+        refine_diff = np.zeros(n_window + 1, dtype=int)
+        np.add.at(refine_diff, sample[refine] + 1, 1)
+        np.add.at(refine_diff, sample[refine + 1], -1)
+        refine_idx = np.flatnonzero((np.cumsum(refine_diff)[:n_window] > 0) & ~exact)
+        refine_dg, stats_refine = HAIRPIN_MEMO.calcu([window_list[i] for i in refine_idx], self.hairpin_jobs)
+        hairpin_dg[refine_idx] = refine_dg
+        exact[refine_idx] = True
+        
+        stats = HAIRPIN_MEMO.stats(n_window,
+                                   stats_sample['primer3_calls'] + stats_refine['primer3_calls'],
+                                   stats_sample['seconds'] + stats_refine['seconds'])
+        stats['interpolated'] = int(np.sum(~exact))
+        
+        return hairpin_dg, stats
+        
+        
+        
+    def calcu_hairpin_score(self, sequence, prescreen=None, stride=None): #seems wrong tool for calculating hairpin!!!
         """
+        prescreen [bool]: only fold the windows of find_inverted_repeat, the others get 0,
+        self.hairpin_prescreen by default
+        stride [int]: > 1 for calcu_hairpin_dg_strided (not combined with prescreen),
+        self.hairpin_stride by default
+        """
+        if prescreen is None:
+            prescreen = self.hairpin_prescreen
+        if stride is None:
+            stride = self.hairpin_stride
+        
         #window_size = self.hairpin_window_size
         #len_left = int(np.floor(window_size/2))
         #len_right = window_size - len_left - 1
@@ -251,32 +800,167 @@ class CalculateScore(object):
         window_size = self.hairpin_window_size
         sequence_slide_window = sliding_window(sequence, window_size)
         tmp = int((window_size - 1)/2)
-        hairpin_score = [0]*tmp + [primer3.calc_hairpin(seq).dg for seq in sequence_slide_window] + [0]*tmp
+        
+        #dG of repeated windows comes from the memo shared by the whole run
+        HAIRPIN_MEMO.resize(self.hairpin_memo_size)
+        if prescreen:
+            flag = self.find_inverted_repeat(sequence)
+            hairpin_dg = np.zeros(len(sequence_slide_window))
+            flag_dg, self.hairpin_stats = HAIRPIN_MEMO.calcu([sequence_slide_window[i] for i in np.flatnonzero(flag)],
+                                                             self.hairpin_jobs)
+            hairpin_dg[flag] = flag_dg
+            self.hairpin_stats['screened_out'] = int(np.sum(~flag))
+        elif stride > 1 and len(sequence_slide_window) > 1:
+            hairpin_dg, self.hairpin_stats = self.calcu_hairpin_dg_strided(sequence_slide_window, stride)
+        else:
+            hairpin_dg, self.hairpin_stats = HAIRPIN_MEMO.calcu(sequence_slide_window, self.hairpin_jobs)
+        hairpin_score = np.concatenate((np.zeros(tmp), hairpin_dg, np.zeros(tmp)))
                 
-        return [-s for s in hairpin_score]
+        return -hairpin_score
     
     
     
+    def report_hairpin_prescreen(self, sequence):
+        """
+        ACCURACY OF THE INVERTED-REPEAT PRESCREEN AGAINST EXHAUSTIVE HAIRPIN SCORING
+        --------------------------------------------------
+        OUTPUTS:
+        -- report [dict]: windows kept by the prescreen, primer3 calls of both modes (distinct
+           windows), positions with a normalized score > 0 that the prescreen misses (false
+           negatives), and the largest differences of the raw and normalized scores
+        """
+        flag = self.find_inverted_repeat(sequence)
+        window_list = sliding_window(sequence, self.hairpin_window_size)
+        
+        score_exhaustive = self.calcu_hairpin_score(sequence, prescreen=False, stride=1)
+        score_prescreen = self.calcu_hairpin_score(sequence, prescreen=True)
+        norm_exhaustive = self.norm_score(score_exhaustive, 'hairpin')
+        norm_prescreen = self.norm_score(score_prescreen, 'hairpin')
+        
+        report = {'windows': len(window_list),
+                  'windows_kept': int(np.sum(flag)),
+                  'primer3_calls_exhaustive': len(set(window_list)),
+                  'primer3_calls_prescreen': len(set(window_list[i] for i in np.flatnonzero(flag))),
+                  'positions_above_threshold': int(np.sum(norm_exhaustive > 0)),
+                  'false_negatives': int(np.sum((norm_exhaustive > 0) & (norm_prescreen == 0))),
+                  'max_raw_difference': float(np.max(np.abs(score_exhaustive - score_prescreen), initial=0)),
+                  'max_norm_difference': float(np.max(np.abs(norm_exhaustive - norm_prescreen), initial=0))}
+        
+        return report
+        
+        
+        
+    def calcu_ndu_surface(self, sequence):
+        """
+        NDU SURFACE (PERIODS x WINDOW POSITIONS) OF THE REPEAT WINDOW SIZE
+        --------------------------------------------------
+        Computed once by DU.getNDU2DWinSeqVec for all periods of the NDU spectrum, only
+        with NDU_surface or NDU_surface_memmap, and then shared by calcu_repeat_score and
+        repeat diagnostics (score_dict['ndu_repeat_score']['surface']).
+        With NDU_surface_memmap, it is a np.memmap of {output_directory}ndu_surface/{label}_ndu_surface.npy.
+        """
+        filename = None
+        if self.NDU_surface_memmap:
+            dir_surface = '{}ndu_surface/'.format(self.dir_output)
+            os.makedirs(dir_surface, exist_ok=True)
+            filename = '{}{}_ndu_surface.npy'.format(dir_surface, self.label)
+        
+        return DU.getNDU2DWinSeqVec(sequence, self.NDU_repeat_window_size, filename=filename)
+        
+        
+        
+    def report_homology_backends(self, sequence):
+        """
+        SPEED AND AGREEMENT OF THE k-MER HOMOLOGY BACKEND (BLAST_KMER) AGAINST blastn
+        --------------------------------------------------
+        OUTPUTS:
+        -- report [dict]: seconds and hits (self-hits and plasmid hits) of each backend,
+           positions with a BLAST score of each backend and of both, their Jaccard index
+           and the largest difference of the normalized scores; the blastn entries are
+           None if blastn or makeblastdb is not installed
+        """
+        backend = self.blast_backend
+        report = dict()
+        score_dict = dict()
+        for name in ['kmer', 'blastn']:
+            if name == 'blastn' and (shutil.which('blastn') is None or shutil.which('makeblastdb') is None):
+                report.update({'seconds_blastn': None, 'hits_blastn': None, 'positions_blastn': None})
+                continue
+            self.blast_backend = name
+            if name == 'blastn':
+                self.make_plasmid_database() #built once, not timed
+            t_start = time.time()
+            score_dict[name] = self.calcu_blast_score(sequence)
+            report['seconds_{}'.format(name)] = time.time() - t_start
+            hits = self.make_blast_single(sequence, subject=True) + self.make_blast_single(
+                sequence, db_file=self.make_plasmid_database() if name == 'blastn' else None)
+            report['hits_{}'.format(name)] = len(hits)
+            report['positions_{}'.format(name)] = int(np.sum(score_dict[name] > 0))
+        self.blast_backend = backend
+        
+        if 'blastn' in score_dict:
+            both = (score_dict['kmer'] > 0) & (score_dict['blastn'] > 0)
+            either = (score_dict['kmer'] > 0) | (score_dict['blastn'] > 0)
+            report['positions_both'] = int(np.sum(both))
+            report['jaccard'] = float(np.sum(both) / np.sum(either)) if np.any(either) else 1.0
+            report['max_norm_difference'] = float(np.max(np.abs(self.norm_score(score_dict['kmer'], 'blast') -
+                                                                self.norm_score(score_dict['blastn'], 'blast')),
+                                                         initial=0))
+        
+        return report
+        
+        
+        
     #uncheck this
-    def calcu_repeat_score(self, sequence):
+    def calcu_repeat_score(self, sequence, ndu_surface=None):
         """
+        NDU REPEAT SCORE
+        --------------------------------------------------
+        The window NDU tracks of the periods above NDU_threshold in the NDU spectrum
+        (and under the repeat window size) are stacked, values under NDU_threshold
+        are set to 0 (noise) and the stack is summed over periods. The summed track
+        is centered on the windows (offset int(W/2)) in a track of len(sequence).
+        
+        By default, only the tracks of these periods are computed. The full surface of
+        calcu_ndu_surface is computed (and its rows are used) only with NDU_surface or
+        NDU_surface_memmap, or if it is given.
+        
+        Memory: the stack holds at most min(W, 100) - 1 periods x (L - W + 1) floats,
+        about 0.8 kB per base for W >= 100 (80 MB for 100 kb) if every period is above
+        threshold, plus one temporary of the same size for the threshold, plus the full
+        surface (the same size) with NDU_surface.
+        
+        INPUTS:
+        -- sequence [str]: sequence
+        -- ndu_surface [np.array]: calcu_ndu_surface(sequence), optional
+        
+        OUTPUTS:
+        -- repeat_score [np.array]: repeat score of each position
         """
-        psAll = DU.getNDUAllSeq(sequence)
+        psAll = DU.getNDUAllSeqVec(sequence)
         idx_list = [k+1 for (k, ele) in enumerate(psAll)
                     if (ele >= self.NDU_threshold) and (k+1) < self.NDU_repeat_window_size]
         #limit to repeats that are above threshold and that are spaced under repeat window size
+        
+        if ndu_surface is None and (self.NDU_surface or self.NDU_surface_memmap):
+            ndu_surface = self.calcu_ndu_surface(sequence)
+        self.ndu_surface = ndu_surface
 
-        repeat_score = [0] * len(sequence)
-        for k in idx_list:
-            tmp_1 = DU.getNDUWindowSeq(sequence, k, self.NDU_repeat_window_size)
-            tmp_2 = [0] * int(self.NDU_repeat_window_size/2)
-            tmp_3 = tmp_2 + tmp_1 + tmp_2
-            tmp_4 = [x if x >= self.NDU_threshold else 0 for x in tmp_3]
+        repeat_score = np.zeros(len(sequence))
+        if len(idx_list) > 0:
+            #periods x window positions
+            if ndu_surface is not None:
+                ndu_stack = np.asarray(ndu_surface[idx_list], dtype=float)
+            else:
+                code = DU.encodeSeq(sequence)
+                ndu_stack = np.array([DU.getNDUWindowCode(code, k, self.NDU_repeat_window_size) for k in idx_list])
+            window_score = np.sum(np.where(ndu_stack >= self.NDU_threshold, ndu_stack, 0), axis=0)
             #remove noise, consider only values above threshold
-            repeat_score = [x1-x2 for (x1, x2) in zip(repeat_score, tmp_4)]
-            #position score vector so far
+            start = int(self.NDU_repeat_window_size/2)
+            end = min(start + len(window_score), len(sequence))
+            repeat_score[start:end] = window_score[:end-start]
   
-        return [-s for s in repeat_score]
+        return repeat_score
         
         
     #unfinished
@@ -290,43 +974,42 @@ class CalculateScore(object):
         -----------------------------------------
         GC score is a value in the range of [0, 100],
         with 0 being the best, and 100 being the worst.
+        x can be a number or an array (piecewise, element by element).
         """
         GC_threshold_lower_limit = 0.2
         GC_threshold_upper_limit = 0.8
         score_scale = 10
         
-        if x <= GC_threshold_lower_limit:
-            return score_scale
-        
-        elif x <= self.GC_threshold_lower:
-            y = (x - self.GC_threshold_lower)**2 / (GC_threshold_lower_limit - self.GC_threshold_lower)**2 * score_scale
-            return y
-            
-        elif x <= self.GC_threshold_upper:
-            return 0
+        x = np.asarray(x, dtype=float)
+        y = np.select([x <= GC_threshold_lower_limit,
+                       x <= self.GC_threshold_lower,
+                       x <= self.GC_threshold_upper,
+                       x <= GC_threshold_upper_limit],
+                      [score_scale,
+                       (x - self.GC_threshold_lower)**2 / (GC_threshold_lower_limit - self.GC_threshold_lower)**2 * score_scale,
+                       0,
+                       (x - self.GC_threshold_upper)**2 / (GC_threshold_upper_limit - self.GC_threshold_upper)**2 * score_scale],
+                      score_scale)
         
-        elif x <= GC_threshold_upper_limit:
-            y = (x - self.GC_threshold_upper)**2 / (GC_threshold_upper_limit - self.GC_threshold_upper)**2 * score_scale
-            return y
-        else:
-            return score_scale
+        return float(y) if y.ndim == 0 else y
         
         
     
     def norm_score(self, score, option):
         """
         """
+        score = np.asarray(score, dtype=float)
         if option == 'gc':
             #change GC content to a normalized GC score:
             #score_normalized = [i*10 if i < self.GC_threshold_lower or i > self.GC_threshold_upper else 0 for i in score]
-            score_normalized = [self.gc_conent_to_score(x) for x in score]
+            score_normalized = self.gc_conent_to_score(score)
         
         elif option == 'blast':
             #score_normalized = [s/2 for s in score]
-            score_normalized = [s/10 for s in score]
+            score_normalized = score / 10
         
         elif option == 'hairpin':
-            score_normalized = [s/500 if s>self.hairpin_threshold else 0 for s in score]
+            score_normalized = np.where(score > self.hairpin_threshold, score / 500, 0)
         
         elif option == 'repeat':
             score_normalized = score
@@ -338,41 +1021,98 @@ class CalculateScore(object):
 
     
 
-    def calcu_score(self, sequence):
+    def load_track(self, option, sequence):
+        """
+        raw and normalized track of a score component ('gc', 'blast', 'hairpin', 'ndu')
+        from the score cache, None if it is not cached (or the cache is not used)
+        """
+        if self.score_cache is None:
+            return None
+        
+        track_dict = self.score_cache.load(self.score_cache.key(option, sequence, self.cache_param_dict[option]))
+        if track_dict is not None:
+            my_print('         cached', not self.parallel)
+            
+        return track_dict
+        
+        
+        
+    def is_cached(self, option, sequence):
+        """
+        whether the track of a score component is in the score cache (without reading it)
+        """
+        return (self.score_cache is not None and
+                self.score_cache.contains(self.score_cache.key(option, sequence, self.cache_param_dict[option])))
+        
+        
+        
+    def save_track(self, option, sequence, track_dict):
+        """
+        write the raw and normalized track of a score component to the score cache
+        """
+        if self.score_cache is not None:
+            self.score_cache.save(self.score_cache.key(option, sequence, self.cache_param_dict[option]),
+                                  {'raw': track_dict['raw'], 'norm': track_dict['norm']})
+            
+            
+            
+    def calcu_score(self, sequence, blast_hits=None):
         """
+        blast_hits [pd.DataFrame]: plasmid hits of the sequence from blast_batch (see calcu_blast_score)
+        
+        Each component track is read from the score cache if it was computed before
+        with the same sequence and parameters (only 'raw' and 'norm' are cached).
         """
         score_dict = dict()
         if self.use_GC:
             my_print('      1) GC score...', not self.parallel)
-            gc_content = self.calcu_gc_content(sequence)
-            
-            gc_score_normalized = self.norm_score(gc_content, 'gc')
-            score_dict['gc_score'] = {'raw': gc_content,
-                                      'norm': gc_score_normalized}
+            score_dict['gc_score'] = self.load_track('gc', sequence)
+            if score_dict['gc_score'] is None:
+                gc_content = self.calcu_gc_content(sequence)
+                
+                gc_score_normalized = self.norm_score(gc_content, 'gc')
+                score_dict['gc_score'] = {'raw': gc_content,
+                                          'norm': gc_score_normalized}
+                self.save_track('gc', sequence, score_dict['gc_score'])
             
         if self.use_BLAST:
             my_print('      2) BLAST score...', not self.parallel)
-            blast_score = self.calcu_blast_score(sequence)
-            blast_score_normalized = self.norm_score(blast_score, 'blast')
-            score_dict['blast_score'] = {'raw': blast_score,
-                                         'norm': blast_score_normalized}
+            score_dict['blast_score'] = self.load_track('blast', sequence)
+            if score_dict['blast_score'] is None:
+                blast_score = self.calcu_blast_score(sequence, blast_hits)
+                blast_score_normalized = self.norm_score(blast_score, 'blast')
+                score_dict['blast_score'] = {'raw': blast_score,
+                                             'norm': blast_score_normalized}
+                self.save_track('blast', sequence, score_dict['blast_score'])
             
         if self.use_Primer3:
             my_print('      3) Primer3 hairpin score...', not self.parallel)
-            hairpin_score = self.calcu_hairpin_score(sequence)
-            hairpin_score_normalized = self.norm_score(hairpin_score, 'hairpin')
-            score_dict['primer3_hairpin_score'] = {'raw': hairpin_score,
-                                                   'norm': hairpin_score_normalized}
+            score_dict['primer3_hairpin_score'] = self.load_track('hairpin', sequence)
+            if score_dict['primer3_hairpin_score'] is None:
+                hairpin_score = self.calcu_hairpin_score(sequence)
+                hairpin_score_normalized = self.norm_score(hairpin_score, 'hairpin')
+                score_dict['primer3_hairpin_score'] = {'raw': hairpin_score,
+                                                       'norm': hairpin_score_normalized,
+                                                       'stats': self.hairpin_stats}
+                self.save_track('hairpin', sequence, score_dict['primer3_hairpin_score'])
+                my_print('         {} windows, {} primer3 calls, hit rate {:.3f}, {:.0f} windows/s'.format(
+                             self.hairpin_stats['windows'], self.hairpin_stats['primer3_calls'],
+                             self.hairpin_stats['hit_rate'], self.hairpin_stats['windows_per_second']),
+                         not self.parallel)
               
             #print('aaa---')
             #print(hairpin_score)
             
         if self.use_NDU:
             my_print('      4) NDU repeat score...', not self.parallel)
-            repeat_score = self.calcu_repeat_score(sequence)
-            repeat_score_normalized = self.norm_score(repeat_score, 'repeat')
-            score_dict['ndu_repeat_score'] = {'raw': repeat_score,
-                                              'norm': repeat_score}
+            score_dict['ndu_repeat_score'] = self.load_track('ndu', sequence)
+            if score_dict['ndu_repeat_score'] is None:
+                repeat_score = self.calcu_repeat_score(sequence)
+                repeat_score_normalized = self.norm_score(repeat_score, 'repeat')
+                score_dict['ndu_repeat_score'] = {'raw': repeat_score,
+                                                  'norm': repeat_score,
+                                                  'surface': self.ndu_surface}
+                self.save_track('ndu', sequence, score_dict['ndu_repeat_score'])
             
         
         #if self.use_MFE:
@@ -381,19 +1121,82 @@ class CalculateScore(object):
         score_normalized = np.array([score_dict[ele]['norm']
                                      for ele in score_dict.keys()],
                                     dtype=float)
-        score_dict['summed_score'] = list(np.sum(score_normalized, axis=0))
+        score_dict['summed_score'] = np.sum(score_normalized, axis=0)
         
         return score_dict
         
         
         
-def score(sequence, param_dict, label):
+def score(sequence, param_dict, label, blast_hits=None):
     """
     """
     my_object = CalculateScore(sequence, param_dict, label)
-    result = my_object.calcu_score(sequence)
+    result = my_object.calcu_score(sequence, blast_hits)
     
     return result
-
-
-
+    
+    
+    
+def blast_batch(label_list, sequence_list, param_dict):
+    """
+    BLAST HITS OF ALL SEQUENCES OF AN EXPERIMENT, SPLIT PER LABEL
+    --------------------------------------------------
+    One blastn call for the whole experiment against the plasmid database instead of
+    one per sequence. Self-hits are left to calcu_blast_score (one blastn call per
+    sequence, run by the workers of submain_parallel), since an all-against-all call
+    grows with the square of the number of sequences and its hits between different
+    sequences are not used.
+    Sequences whose BLAST track is in the score cache are left out (and have no
+    entry in blast_hits_dict), no blastn is run if all of them are.
+    
+    INPUTS:
+    -- label_list [list]: labels of the sequences
+    -- sequence_list [list]: DNA sequences
+    -- param_dict [dict]: parameters
+    
+    OUTPUTS:
+    -- blast_hits_dict [dict]: label -> plasmid hits [pd.DataFrame], for score
+    """
+    my_object = CalculateScore(None, param_dict, 'batch')
+    
+    is_missing = [not my_object.is_cached('blast', sequence) for sequence in sequence_list]
+    my_print('   {} of {} sequences with a cached BLAST track'.format(len(is_missing) - sum(is_missing),
+                                                                      len(is_missing)), True)
+    label_list = [label for (label, missing) in zip(label_list, is_missing) if missing]
+    sequence_list = [sequence for (sequence, missing) in zip(sequence_list, is_missing) if missing]
+    if len(sequence_list) == 0:
+        return dict()
+    
+    plasmid_hits = my_object.make_blast_batch(sequence_list, db_file=my_object.make_plasmid_database())
+    plasmid_dict = {qseqid: hits for (qseqid, hits) in plasmid_hits.groupby('qseqid')}
+    no_hits = pd.DataFrame(columns=BLAST_TABULAR_FIELDS)
+    
+    blast_hits_dict = {label: plasmid_dict.get(str(k), no_hits) for (k, label) in enumerate(label_list)}
+    
+    return blast_hits_dict
+    
+    
+    
+def hairpin_prescreen_report(sequence, param_dict, label):
+    """
+    see CalculateScore.report_hairpin_prescreen
+    """
+    my_object = CalculateScore(sequence, param_dict, label)
+    report = my_object.report_hairpin_prescreen(sequence)
+    for (key, value) in report.items():
+        my_print('   {}: {}'.format(key, value), True)
+    
+    return report
+    
+    
+    
+def homology_benchmark(sequence, param_dict, label):
+    """
+    see CalculateScore.report_homology_backends
+    """
+    my_object = CalculateScore(sequence, param_dict, label)
+    report = my_object.report_homology_backends(sequence)
+    for (key, value) in report.items():
+        my_print('   {}: {}'.format(key, value), True)
+    
+    return report
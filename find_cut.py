@@ -2,10 +2,63 @@ import pandas as pd
 import numpy as np
 import time
 import argparse
-from sub_functions import my_print
+import os
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from sub_functions import my_print, in_daemon_process
 
+
+L_PART = 100000 #longer score tracks are cut part by part
+
+
+
+class SparseTable(object):
+    """
+    RANGE MAXIMUM (OR MINIMUM) QUERIES IN O(1) AFTER AN O(N log N) BUILD
+    --------------------------------------------------
+    index_table[j, i] is the index of the max (min) of values[i: i + 2**j].
+    Ties are resolved to the leftmost index.
+    """
+    def __init__(self, values, op='max'):
+        self.values = np.asarray(values, dtype=float)
+        self.op = op #'max' or 'min'
+        N = len(self.values)
+        
+        n_level = max(1, int(N).bit_length())
+        self.index_table = np.zeros((n_level, max(N, 1)), dtype=np.int64)
+        self.index_table[0, :N] = np.arange(N)
+        for j in range(1, n_level):
+            half = 2**(j-1)
+            num = N - 2**j + 1
+            self.index_table[j, :num] = self._pick(self.index_table[j-1, :num],
+                                                   self.index_table[j-1, half:half+num])
+            
+            
+    def _pick(self, idx_1, idx_2):
+        # keep idx_1 unless idx_2 is strictly better
+        if self.op == 'max':
+            take_2 = self.values[idx_2] > self.values[idx_1]
+        elif self.op == 'min':
+            take_2 = self.values[idx_2] < self.values[idx_1]
+        return np.where(take_2, idx_2, idx_1)
+        
+        
+    def argquery(self, lo, hi):
+        # index of the max (min) of values[lo: hi+1] (0-based, lo <= hi), lo and hi can be arrays
+        lo, hi = np.asarray(lo), np.asarray(hi)
+        level = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+        return self._pick(self.index_table[level, lo],
+                          self.index_table[level, hi - 2**level + 1])
+                          
+                          
+    def query(self, lo, hi):
+        return self.values[self.argquery(lo, hi)]
+        
+        
+        
 class CutBlocks(object):
-    def __init__(self, position_score, n, l_min, l_max, o_min, o_max):
+    def __init__(self, position_score, n, l_min, l_max, o_min, o_max, opt_obj='max',
+                 cost_type='sum', skip_size_list=(20, 10, 5, 2, 1)):
         self.position_score = position_score
         self.n = n #number of fragments
         self.l_min, self.l_max = l_min, l_max
@@ -17,7 +70,25 @@ class CutBlocks(object):
         #if self.n_min > self.n_max:
         #    print('break because: no valid n found')
         
-        self.opt_obj = 'max'
+        self.opt_obj = opt_obj #'max' or 'sum', how the costs of the overlaps are combined
+        self.cost_type = cost_type #'sum' or 'max', cost of one overlap: summed or peak position score
+        self.skip_size_list = list(skip_size_list) #[1] for full resolution
+        
+        self.setScore(position_score)
+        
+        
+    def setScore(self, position_score):
+        # (re)build the structures that make the cost of any overlap O(1)
+        if len(position_score) != self.L:
+            raise ValueError('the score track must keep its length {}'.format(self.L))
+        self.position_score = position_score
+        self.overlap_min_table = None #built by lowerBound when needed
+        if self.cost_type == 'sum':
+            self.score_cumsum = np.concatenate(([0], np.cumsum(np.asarray(position_score, dtype=float))))
+        elif self.cost_type == 'max':
+            self.score_sparse_table = SparseTable(position_score, 'max')
+        else:
+            raise ValueError('unknown cost_type: {}'.format(self.cost_type))
        
 
     def startState(self):
@@ -31,16 +102,25 @@ class CutBlocks(object):
     def calcuCost(self, state_s, state_e, state_k):
         # return cost of a state
         if not self.isEnd(state_s, state_e, state_k):
-            return sum(self.position_score[state_s-1: state_e])
+            return float(self.calcuCostArray(state_s, state_e))
         else:
             return 0
+            
+            
+    def calcuCostArray(self, state_s, state_e):
+        # cost of the overlaps [state_s, state_e] (1-based, inclusive), state_s and state_e can be arrays
+        if self.cost_type == 'sum':
+            return self.score_cumsum[state_e] - self.score_cumsum[np.asarray(state_s) - 1]
+        elif self.cost_type == 'max':
+            lo, hi = np.asarray(state_s) - 1, np.asarray(state_e) - 1
+            return np.where(hi < lo, 0, self.score_sparse_table.query(lo, np.maximum(lo, hi)))
 
     
     def succAndCost(self, state_s, state_e, state_k):
         # return a list of (state_s, state_e, state_k, cost)
         
         if state_k != 1:
-            skip_size_list = [20, 10, 5, 2, 1]
+            skip_size_list = self.skip_size_list
             #skip_size_list = [10, 5, 2, 1]
             #skip_size_list = [1]
             result = []
@@ -56,10 +136,15 @@ class CutBlocks(object):
                                    self.L - (state_k - 1) * self.l_min + (state_k - 2) * self.o_max) + 1)
                                for new_e in new_e_list]
             
-                result = [(new_s, new_e, state_k-1, self.calcuCost(new_s, new_e, state_k-1))
-                          for (j, new_e) in enumerate(new_e_list)
-                          if b1_b2_list[j][1] - b1_b2_list[j][0] >= 0
-                          for new_s in range(b1_b2_list[j][0], b1_b2_list[j][1] + 1)]
+                new_state_list = [(new_s, new_e)
+                                  for (j, new_e) in enumerate(new_e_list)
+                                  if b1_b2_list[j][1] - b1_b2_list[j][0] >= 0
+                                  for new_s in range(b1_b2_list[j][0], b1_b2_list[j][1] + 1)]
+                if len(new_state_list) > 0:
+                    new_s_array, new_e_array = np.array(new_state_list).T
+                    cost_list = self.calcuCostArray(new_s_array, new_e_array).tolist()
+                    result = [(new_s, new_e, state_k-1, cost)
+                              for ((new_s, new_e), cost) in zip(new_state_list, cost_list)]
                 i += 1
                 
             return result
@@ -69,8 +154,10 @@ class CutBlocks(object):
             
 
 ### Algorithms
-def dynamicProgramming(problem):
-    cache = {} # state -> futureCost(state)
+def dynamicProgramming(problem, cache=None):
+    # cache does not depend on problem.n, so it can be shared by problems that only differ in n
+    if cache is None:
+        cache = {} # state -> futureCost(state)
     def futureCost(state_s, state_e, state_k):
         # Base case
         if problem.isEnd(state_s, state_e, state_k):
@@ -116,45 +203,1102 @@ def dynamicProgramming(problem):
     
     return (totalCost, history)
     
+    
+    
+def fillCostTable(problem, n_best=1, bound_dict=None):
+    """
+    BOTTOM-UP FILL OF THE DP TABLE OF A CutBlocks PROBLEM
+    --------------------------------------------------
+    futureCost only depends on the start s of the current block and on the number
+    k of blocks left (including the current one), so the whole DP is kept in arrays
+    indexed by (k, s), s = 1, ..., L. Layer k is filled from layer k-1 with one
+    vectorized pass per (block end offset, overlap length) instead of one Python
+    frame per state. Successors (including the skip size logic of succAndCost) and
+    tie-breaking (smallest next start, then smallest block end) are the same as in
+    dynamicProgramming, and the overlap costs come from problem.calcuCostArray as in
+    succAndCost, so the traceback gives the same plan.
+    
+    With n_best > 1, each state keeps its n_best best (successor, rank of the
+    successor's plan) pairs instead of the best successor only (k-best traceback).
+    Two different pairs give two different plans, so the ranks 0, ..., n_best-1 of
+    a state are its n_best cheapest distinct plans, and rank 0 is the plan of n_best = 1.
+    
+    With bound_dict (n -> lowerBound for the candidate numbers of blocks), the fill
+    stops after layer k as soon as no candidate n > k can beat (or, for n_best > 1,
+    enter) the plans of the candidates n <= k (branch and bound). The layers above
+    are left at np.inf, as if they had no valid plan.
+    
+    INPUTS:
+    -- problem [CutBlocks]
+    -- n_best [int]: number of plans kept for each state
+    -- bound_dict [dict]: see lowerBoundDict
+    
+    OUTPUTS:
+    -- table [dict]: arrays indexed by (k, s, rank)
+       'cost': future cost of state (k, s), np.inf if there is no successor
+       'next_s': start of the next block in the successor
+       'next_e': end of the current block in the successor
+       'next_rank': rank of the plan of the successor state
+       'n_filled': the last layer filled
+       'problem': the CutBlocks problem
+    """
+    L, n = problem.L, problem.n
+    K = n_best
+    
+    cost_table = np.full((n+1, L+1, K), np.inf)
+    next_s_table = np.zeros((n+1, L+1, K), dtype=np.int64)
+    next_e_table = np.zeros((n+1, L+1, K), dtype=np.int64)
+    next_rank_table = np.zeros((n+1, L+1, K), dtype=np.int64)
+    
+    #k == 1: the only successor is the end state (L, L, 0) with cost 0
+    cost_table[1, 1:, 0] = 0
+    next_s_table[1, 1:] = L
+    next_e_table[1, 1:] = L
+    
+    table = {'cost': cost_table,
+             'next_s': next_s_table,
+             'next_e': next_e_table,
+             'next_rank': next_rank_table,
+             'n_filled': n,
+             'problem': problem}
+    
+    pos_s = np.arange(1, L+1)
+    for k in range(2, n+1):
+        fillCostLayer(table, k, pos_s)
+        
+        if bound_dict is not None:
+            #the n_best-th plan of the candidates n <= k, the candidates n > k have to beat it
+            plan_list = sorted((cost_table[j, 1, rank], j) for j in bound_dict.keys() if j <= k
+                                                            for rank in range(K))
+            if len(plan_list) >= K and all(isPruned(bound_dict[j], j, *plan_list[K-1])
+                                           for j in bound_dict.keys() if j > k):
+                table['n_filled'] = k
+                break
+    
+    return table
+    
+    
+    
+def solveLayer(problem, k, prev_cost, pos_s):
+    """
+    BEST SUCCESSORS OF THE STATES (k, s), s IN pos_s, FROM THE FUTURE COSTS OF LAYER k-1
+    --------------------------------------------------
+    Successors (including the skip size logic of succAndCost) and tie-breaking are the
+    ones of dynamicProgramming, see fillCostTable.
+    
+    INPUTS:
+    -- problem [CutBlocks]
+    -- k [int]: number of blocks left
+    -- prev_cost [np.array]: future costs of layer k-1, shape (L+1, n_best)
+    -- pos_s [np.array]: block starts, sorted
+    
+    OUTPUTS:
+    -- (s_idx, best_cost, best_s, best_e, best_rank): the block starts of pos_s with a
+       successor, and their n_best best (cost, next start, block end, rank of the successor)
+    """
+    L = problem.L
+    l_min, l_max = problem.l_min, problem.l_max
+    o_min, o_max = problem.o_min, problem.o_max
+    K = prev_cost.shape[1]
+    rank = np.arange(K)
+    result_list = []
+    
+    #the next start new_s must satisfy new_s-1 in [b_low, b_high] (see succAndCost)
+    b_low = L - (k-1) * l_max + (k-2) * o_min
+    b_high = L - (k-1) * l_min + (k-2) * o_max
+    if b_high < b_low:
+        pos_s = pos_s[:0]
+    
+    #pick the skip size the same way as succAndCost: the first one that gives a successor
+    unassigned = np.ones(len(pos_s), dtype=bool)
+    for skip_size in problem.skip_size_list:
+        e_first = pos_s + l_min - 1
+        e_first = e_first + np.maximum(0, -((e_first - (b_low + o_min)) // skip_size)) * skip_size
+        has_succ = unassigned & (e_first <= np.minimum(b_high + o_max, pos_s + l_max - 1))
+        unassigned &= ~has_succ
+        if not has_succ.any():
+            continue
+        
+        s_idx = pos_s[has_succ]
+        best_cost = np.full((len(s_idx), K), np.inf)
+        best_s = np.full((len(s_idx), K), L+1, dtype=np.int64)
+        best_e = np.full((len(s_idx), K), L+1, dtype=np.int64)
+        best_rank = np.zeros((len(s_idx), K), dtype=np.int64)
+        for e_offset in range(l_min - 1, l_max, skip_size):
+            e_idx = s_idx + e_offset
+            for o in range(o_min, o_max + 1):
+                new_s = e_idx - o + 1
+                valid = (new_s - 1 >= b_low) & (new_s - 1 <= b_high)
+                if not valid.any():
+                    continue
+                new_s_c = np.minimum(new_s, L)
+                cost = problem.calcuCostArray(new_s_c, np.clip(e_idx, new_s_c - 1, L))
+                if problem.opt_obj == 'sum':
+                    total = cost[:, None] + prev_cost[new_s_c]
+                elif problem.opt_obj == 'max':
+                    total = np.maximum(cost[:, None], prev_cost[new_s_c])
+                total[~valid] = np.inf
+                
+                if K == 1:
+                    total = total[:, 0]
+                    better = valid & ((total < best_cost[:, 0])
+                                      | ((total == best_cost[:, 0])
+                                         & ((new_s < best_s[:, 0])
+                                            | ((new_s == best_s[:, 0]) & (e_idx < best_e[:, 0])))))
+                    best_cost[better, 0] = total[better]
+                    best_s[better, 0] = new_s[better]
+                    best_e[better, 0] = e_idx[better]
+                    continue
+                
+                #merge the K plans through this successor into the K best so far,
+                #ordered by cost, then next start, block end and rank
+                all_cost = np.concatenate([best_cost, total], axis=1)
+                all_s = np.concatenate([best_s, np.repeat(new_s[:, None], K, axis=1)], axis=1)
+                all_e = np.concatenate([best_e, np.repeat(e_idx[:, None], K, axis=1)], axis=1)
+                all_rank = np.concatenate([best_rank, np.broadcast_to(rank, (len(s_idx), K))], axis=1)
+                order = np.lexsort((all_rank, all_e, all_s, all_cost), axis=-1)[:, :K]
+                best_cost = np.take_along_axis(all_cost, order, axis=1)
+                best_s = np.take_along_axis(all_s, order, axis=1)
+                best_e = np.take_along_axis(all_e, order, axis=1)
+                best_rank = np.take_along_axis(all_rank, order, axis=1)
+                
+        result_list.append((s_idx, best_cost, best_s, best_e, best_rank))
+    
+    if len(result_list) == 0:
+        return (pos_s[:0], np.zeros((0, K)), np.zeros((0, K), dtype=np.int64),
+                np.zeros((0, K), dtype=np.int64), np.zeros((0, K), dtype=np.int64))
+    return tuple(np.concatenate(result, axis=0) for result in zip(*result_list))
+    
+    
+    
+def fillCostLayer(table, k, pos_s):
+    """
+    (RE)COMPUTE LAYER k OF A TABLE OF fillCostTable FOR THE BLOCK STARTS pos_s
+    --------------------------------------------------
+    Layer k-1 must be up to date. Each state is computed from scratch from its
+    successors (solveLayer), the other states of layer k are left as they are.
+    
+    INPUTS:
+    -- table [dict]: see fillCostTable, updated in place
+    -- k [int]: number of blocks left
+    -- pos_s [np.array]: block starts, sorted
+    
+    OUTPUTS:
+    -- changed [np.array]: the block starts in pos_s whose entries have changed
+    """
+    s_idx, best_cost, best_s, best_e, best_rank = solveLayer(table['problem'], k, table['cost'][k-1], pos_s)
+    
+    changed = ((table['cost'][k, s_idx] != best_cost)
+               | (table['next_s'][k, s_idx] != best_s)
+               | (table['next_e'][k, s_idx] != best_e)
+               | (table['next_rank'][k, s_idx] != best_rank)).any(axis=1)
+    table['cost'][k, s_idx] = best_cost
+    table['next_s'][k, s_idx] = best_s
+    table['next_e'][k, s_idx] = best_e
+    table['next_rank'][k, s_idx] = best_rank
+    
+    return s_idx[changed]
+    
+    
+    
+def updateCostTable(table, position_score, change_start, change_end):
+    """
+    INCREMENTAL UPDATE OF A TABLE OF fillCostTable AFTER A LOCAL CHANGE OF THE SCORE
+    --------------------------------------------------
+    Only the overlaps that intersect [change_start, change_end] change their cost, so
+    in each layer only the states with such an overlap among their successors, or with a
+    successor whose entry changed in the layer below, are recomputed with fillCostLayer.
+    States to the right of the change never move, and the update stops spreading to the
+    left as soon as a layer is left unchanged outside the changed interval. The layers
+    that a pruned fill (see fillCostTable) has skipped are filled entirely.
+    With cost_type 'sum' the result can differ from a full refill by the rounding of
+    the new prefix sums (exact for integer scores).
+    
+    INPUTS:
+    -- table [dict]: see fillCostTable, updated in place
+    -- position_score [list]: the new score track, same length as before
+    -- change_start, change_end [int]: the changed positions, 1-based, inclusive
+    
+    OUTPUTS:
+    -- n_recomputed [int]: number of (k, s) states recomputed
+    """
+    problem = table['problem']
+    problem.setScore(position_score)
+    L, n = problem.L, problem.n
+    l_min, l_max = problem.l_min, problem.l_max
+    o_min, o_max = problem.o_min, problem.o_max
+    
+    #block starts with a successor overlap [new_s, new_e] intersecting the change:
+    #new_e <= s + l_max - 1 and new_s >= s + l_min - o_max
+    direct = np.zeros(L+2, dtype=np.int64)
+    direct[max(1, change_start - l_max + 1)] += 1
+    direct[max(1, min(L, change_end - l_min + o_max)) + 1] -= 1
+    
+    n_recomputed = 0
+    changed = np.array([], dtype=np.int64)
+    for k in range(2, n+1):
+        #block starts with a changed successor start t in [s + l_min - o_max, s + l_max - o_min]
+        dirty = direct.copy()
+        np.add.at(dirty, np.clip(changed - l_max + o_min, 1, L+1), 1)
+        np.add.at(dirty, np.clip(changed - l_min + o_max + 1, 1, L+1), -1)
+        pos_s = np.flatnonzero(np.cumsum(dirty)[1:L+1] > 0) + 1
+        if k > table['n_filled']:
+            pos_s = np.arange(1, L+1)
+        
+        changed = fillCostLayer(table, k, pos_s)
+        n_recomputed += len(pos_s)
+    table['n_filled'] = n
+        
+    return n_recomputed
+    
+    
+    
+def tracebackCostTable(table, n, rank=0):
+    """
+    RECOVER THE HISTORY OF THE PLAN WITH n BLOCKS OF A GIVEN RANK FROM A TABLE OF fillCostTable
+    --------------------------------------------------
+    INPUTS:
+    -- rank [int]: 0 for the optimal plan, 1 for the second best, ..., < n_best of the table
+    
+    OUTPUTS:
+    -- (totalCost, history): same format as dynamicProgramming
+    """
+    problem = table['problem']
+    totalCost = table['cost'][n, 1, rank]
+    if not np.isfinite(totalCost): #no valid plan with n blocks (of this rank)
+        return (float(totalCost), [])
+    
+    history = []
+    state_s, state_k, state_rank = 1, n, rank
+    while state_k > 1:
+        newState_s = int(table['next_s'][state_k, state_s, state_rank])
+        newState_e = int(table['next_e'][state_k, state_s, state_rank])
+        state_rank = int(table['next_rank'][state_k, state_s, state_rank])
+        cost = problem.calcuCost(newState_s, newState_e, state_k - 1)
+        history.append((newState_s, newState_e, state_k - 1, cost))
+        state_s, state_k = newState_s, state_k - 1
+    history.append((problem.L, problem.L, 0, 0))
+    
+    return (float(totalCost), history)
+    
+    
+    
+def tabulatedDynamicProgramming(problem):
+    """
+    SAME AS dynamicProgramming, BUT WITH THE ARRAY-BACKED TABLE OF fillCostTable
+    """
+    table = fillCostTable(problem)
+    
+    return tracebackCostTable(table, problem.n)
+    
+    
+    
+def fillCheckpoints(problem, checkpoint=None, bound_dict=None):
+    """
+    LOW-MEMORY FILL OF THE DP OF A CutBlocks PROBLEM: ROLLING LAYERS AND CHECKPOINTS
+    --------------------------------------------------
+    Same DP as fillCostTable (n_best = 1), but layer k is dropped once layer k+1 is
+    filled, except every checkpoint-th layer. Only the future costs are kept, the
+    successors are recomputed by tracebackCheckpoints. With checkpoint ~ sqrt(n), at
+    most ~2 sqrt(n) + 2 layers of L+1 floats are alive at any time, instead of the
+    4 (n+1) x (L+1) arrays of fillCostTable or one memo entry per state of
+    dynamicProgramming.
+    
+    INPUTS:
+    -- problem [CutBlocks]
+    -- checkpoint [int]: distance between two kept layers, ceil(sqrt(n)) by default
+    -- bound_dict [dict]: branch and bound as in fillCostTable
+    
+    OUTPUTS:
+    -- state [dict]:
+       'cost': future cost of state (k, 1) for k = 0, ..., n, i.e. the optimal cost with k blocks
+       'checkpoint_layer': k -> future costs of layer k, shape (L+1, 1), for k = 1, 1+checkpoint, ...
+       'checkpoint': distance between two kept layers
+       'n_filled': the last layer filled
+       'problem': the CutBlocks problem
+    """
+    L, n = problem.L, problem.n
+    if checkpoint is None:
+        checkpoint = max(1, int(np.ceil(np.sqrt(n))))
+    
+    #k == 1: the only successor is the end state (L, L, 0) with cost 0
+    layer = np.full((L+1, 1), np.inf)
+    layer[1:] = 0
+    state = {'cost': np.full(n+1, np.inf),
+             'checkpoint_layer': {1: layer},
+             'checkpoint': checkpoint,
+             'n_filled': n,
+             'problem': problem}
+    state['cost'][1] = 0
+    
+    pos_s = np.arange(1, L+1)
+    for k in range(2, n+1):
+        s_idx, best_cost, _, _, _ = solveLayer(problem, k, layer, pos_s)
+        layer = np.full((L+1, 1), np.inf)
+        layer[s_idx] = best_cost
+        state['cost'][k] = layer[1, 0]
+        if (k - 1) % checkpoint == 0:
+            state['checkpoint_layer'][k] = layer
+            
+        if bound_dict is not None:
+            plan_list = [(state['cost'][j], j) for j in bound_dict.keys() if j <= k]
+            if len(plan_list) > 0 and all(isPruned(bound_dict[j], j, *min(plan_list))
+                                          for j in bound_dict.keys() if j > k):
+                state['n_filled'] = k
+                break
+    
+    return state
+    
+    
+    
+def tracebackCheckpoints(state, n):
+    """
+    RECOVER THE HISTORY OF THE OPTIMAL PLAN WITH n BLOCKS FROM A STATE OF fillCheckpoints
+    --------------------------------------------------
+    Going down from k = n, the layers between the checkpoint below k-1 and k-1 are
+    recomputed once (at most checkpoint layers at a time), and the successor of the
+    current state (k, s) is found with solveLayer on this single state. The plan is the
+    one of tracebackCostTable.
+    
+    OUTPUTS:
+    -- (totalCost, history): same format as dynamicProgramming
+    """
+    problem = state['problem']
+    checkpoint = state['checkpoint']
+    totalCost = state['cost'][n]
+    if not np.isfinite(totalCost): #no valid plan with n blocks
+        return (float(totalCost), [])
+    
+    history = []
+    state_s, state_k = 1, n
+    while state_k > 1:
+        #recompute the layers from the checkpoint below state_k-1 up to state_k-1
+        base = 1 + ((state_k - 2) // checkpoint) * checkpoint
+        segment = {base: state['checkpoint_layer'][base]}
+        pos_s = np.arange(1, problem.L + 1)
+        for k in range(base + 1, state_k):
+            s_idx, best_cost, _, _, _ = solveLayer(problem, k, segment[k-1], pos_s)
+            segment[k] = np.full((problem.L + 1, 1), np.inf)
+            segment[k][s_idx] = best_cost
+        
+        while state_k - 1 >= base:
+            _, _, best_s, best_e, _ = solveLayer(problem, state_k, segment[state_k - 1], np.array([state_s]))
+            newState_s, newState_e = int(best_s[0, 0]), int(best_e[0, 0])
+            cost = problem.calcuCost(newState_s, newState_e, state_k - 1)
+            history.append((newState_s, newState_e, state_k - 1, cost))
+            state_s, state_k = newState_s, state_k - 1
+    history.append((problem.L, problem.L, 0, 0))
+    
+    return (float(totalCost), history)
+    
+    
+    
+def overlapCostMatrix(problem, N=None):
+    """
+    COST OF EVERY OVERLAP OF A CutBlocks PROBLEM
+    --------------------------------------------------
+    overlap_cost[m, t] is the cost of the overlap of length o_min + m starting at
+    position t (1-based, column 0 is unused), np.inf if it runs past the end of the
+    track. Only the first N start positions are filled (all of them by default).
+    """
+    L = problem.L
+    if N is None:
+        N = L
+    o_list = list(range(problem.o_min, problem.o_max + 1))
+    
+    overlap_cost = np.full((len(o_list), N+1), np.inf)
+    for (m, o) in enumerate(o_list):
+        t = np.arange(1, min(N, L - o + 1) + 1)
+        overlap_cost[m, t] = problem.calcuCostArray(t, t + o - 1)
+        
+    return overlap_cost
+    
+    
+    
+def forwardLayer(layer_cost, overlap_cost, o_list, l_min, l_max, opt_obj):
+    """
+    ONE LAYER OF THE FORWARD DP OVER BLOCK START POSITIONS
+    --------------------------------------------------
+    new_cost[t] = min over o = o_list[m] and s in [t+o-l_max, t+o-l_min] of
+                  combine(layer_cost[s], overlap_cost[m, t]),
+    i.e. the block [s, t+o-1] is finished and the next block starts at t. The
+    minimum over s is a range-minimum query on layer_cost (SparseTable), so a layer
+    costs O(N log N) whatever the range of block lengths.
+    
+    INPUTS:
+    -- layer_cost [np.ndarray]: cost of each block start of the previous layer (np.inf if not reached)
+    -- overlap_cost [np.ndarray]: (len(o_list), len(layer_cost)), np.inf for invalid overlaps
+    -- opt_obj [str]: 'max' or 'sum'
+    
+    OUTPUTS:
+    -- (new_cost, arg_s, arg_o) [np.ndarray]: cost of each block start, with the start of the
+       previous block and the overlap length of the best transition
+    """
+    N = len(layer_cost)
+    new_cost = np.full(N, np.inf)
+    arg_s = np.zeros(N, dtype=np.int64)
+    arg_o = np.zeros(N, dtype=np.int64)
+    
+    finite = np.nonzero(np.isfinite(layer_cost))[0]
+    if len(finite) == 0:
+        return (new_cost, arg_s, arg_o)
+    f_low, f_high = finite[0], finite[-1]
+    t_low, t_high = max(0, f_low + l_min - max(o_list)), min(N - 1, f_high + l_max - min(o_list))
+    if t_low > t_high:
+        return (new_cost, arg_s, arg_o)
+        
+    rmq = SparseTable(layer_cost[f_low: f_high+1], 'min')
+    t_idx = np.arange(t_low, t_high + 1)
+    for (m, o) in enumerate(o_list):
+        s_low = np.maximum(t_idx + o - l_max, f_low)
+        s_high = np.minimum(t_idx + o - l_min, f_high)
+        valid = (s_low <= s_high) & np.isfinite(overlap_cost[m, t_idx])
+        if not valid.any():
+            continue
+        t_valid = t_idx[valid]
+        s_arg = f_low + rmq.argquery(s_low[valid] - f_low, s_high[valid] - f_low)
+        if opt_obj == 'sum':
+            total = layer_cost[s_arg] + overlap_cost[m, t_valid]
+        elif opt_obj == 'max':
+            total = np.maximum(layer_cost[s_arg], overlap_cost[m, t_valid])
+            
+        better = total < new_cost[t_valid]
+        new_cost[t_valid[better]] = total[better]
+        arg_s[t_valid[better]] = s_arg[better]
+        arg_o[t_valid[better]] = o
+        
+    return (new_cost, arg_s, arg_o)
+    
+    
+    
+def streamingDynamicProgramming(position_score, n_min, n_max, l_min=1000, l_max=1744, o_min=50, o_max=50,
+                                opt_obj='max', cost_type='sum', window=20000, seam=5000):
+    """
+    STREAMING, WINDOWED DP FOR LONG SCORE TRACKS
+    --------------------------------------------------
+    Forward DP at full resolution (skip size 1) over one window of the score track
+    at a time. In a window, the state (j, t) means that j blocks are finished since
+    the start of the window and the next block starts at t; layer j+1 is filled
+    from layer j with range-minimum queries (SparseTable), one per overlap length.
+    The best state in the last `seam` positions of the window is traced back, the
+    blocks that end before the seam are committed, and the next window starts at
+    the last committed block, so consecutive windows overlap by about `seam`
+    positions. A state is kept only if the rest of the sequence can still be
+    covered with a total number of blocks in [n_min, n_max]. The last window is
+    solved exactly. Only one window of scores and DP layers is held in memory, so
+    the memory does not depend on the total length.
+    
+    This is a heuristic: the blocks committed before a seam are never revisited, so
+    the plan can be worse than the exact optimum (e.g. 375.6 against 371.9 and 771.5
+    against 758.3 on random 30-60 kb tracks with opt_obj='sum'). Use the other
+    engines on tracks <= L_PART when the exact optimum is needed.
+    
+    INPUTS:
+    -- position_score [list]: position score for each base pair
+    -- n_min, n_max [int]: range allowed for the total number of blocks
+    -- opt_obj [str], cost_type [str]: see CutBlocks
+    -- window [int]: number of block start positions solved together
+    -- seam [int]: positions at the end of a window that are solved again in the next one
+    
+    OUTPUTS:
+    -- (totalCost, x_frag_list, y_frag_list): (np.inf, [], []) if there is no valid plan
+    """
+    L = len(position_score)
+    if seam < l_max or window < seam + l_max:
+        raise ValueError('seam >= l_max and window >= seam + l_max are required')
+    
+    def feasible(pos, n_done):
+        # can [pos, L] be covered with k blocks, n_done + k in [n_min, n_max]?
+        remain = L - pos + 1
+        k_low = np.maximum(-((o_min - remain) // (l_max - o_min)), max(1, n_min - n_done))
+        k_high = np.minimum((remain - o_max) // (l_min - o_max), n_max - n_done)
+        return k_low <= k_high
+    
+    o_list = list(range(o_min, o_max + 1))
+    x_frag_list, y_frag_list = [], []
+    pos_start, n_done, cost_done = 1, 0, 0
+    while True:
+        pos_end = min(L, pos_start + window - 1) #last block start considered in this window
+        is_last = pos_end == L
+        W = pos_end - pos_start + 1
+        
+        #scores of the window, including the overlaps starting at its end
+        segment = np.asarray(position_score[pos_start-1: min(L, pos_end + o_max - 1)], dtype=float)
+        segment_problem = CutBlocks(segment, 1, l_min, l_max, o_min, o_max, opt_obj, cost_type)
+        overlap_cost = overlapCostMatrix(segment_problem, W)[:, 1:]
+        
+        #forward DP, all indices are relative to pos_start
+        layer_cost = [np.full(W, np.inf)]
+        layer_cost[0][0] = cost_done
+        layer_s, layer_o = [None], [None]
+        for j in range(W // (l_min - o_max) + 1):
+            new_cost, new_s, new_o = forwardLayer(layer_cost[j], overlap_cost, o_list,
+                                                  l_min, l_max, opt_obj)
+            new_cost[~feasible(pos_start + np.arange(W), n_done + j + 1)] = np.inf
+            if not np.isfinite(new_cost).any():
+                break
+            layer_cost.append(new_cost)
+            layer_s.append(new_s)
+            layer_o.append(new_o)
+        
+        #pick the state to trace back from
+        pos = pos_start + np.arange(W)
+        if is_last: #the last block [t, L]
+            candidate_list = [(layer_cost[j][i], n_done + j + 1, j, i)
+                              for j in range(len(layer_cost))
+                              if n_min <= n_done + j + 1 <= n_max
+                              for i in np.nonzero(np.isfinite(layer_cost[j])
+                                                  & (L - pos + 1 >= l_min) & (L - pos + 1 <= l_max))[0]]
+        else: #the furthest of the best states after the seam
+            seam_start = window - seam
+            candidate_list = [(layer_cost[j][i], -i, j, i)
+                              for j in range(len(layer_cost))
+                              for i in seam_start + np.nonzero(np.isfinite(layer_cost[j][seam_start:]))[0]]
+        if len(candidate_list) == 0:
+            return (np.inf, [], [])
+        _, _, j, i = min(candidate_list)
+        
+        path = [(j, i)]
+        while j > 0:
+            i = layer_s[j][i]
+            j -= 1
+            path.append((j, i))
+        path.reverse()
+        
+        if is_last:
+            n_commit = len(path) - 1
+        else:
+            n_commit = max(c for c in range(len(path)) if path[c][1] <= window - seam)
+        for c in range(1, n_commit + 1):
+            (j, i), (_, i_prev) = path[c], path[c-1]
+            x_frag_list.append(pos_start + i_prev)
+            y_frag_list.append(pos_start + i + layer_o[j][i] - 1)
+            
+        j, i = path[n_commit]
+        if is_last:
+            x_frag_list.append(pos_start + i)
+            y_frag_list.append(L)
+            return (float(layer_cost[j][i]), [int(x) for x in x_frag_list], [int(y) for y in y_frag_list])
+            
+        pos_start, n_done, cost_done = pos_start + i, n_done + j, layer_cost[j][i]
+    
+    
+
+def thresholdSearch(problem):
+    """
+    MINIMAX SOLVER FOR opt_obj == 'max': BINARY SEARCH OVER THE OVERLAP COSTS
+    --------------------------------------------------
+    A plan with cost <= T exists iff position L can be reached from position 1 with
+    problem.n blocks using only overlaps of cost <= T. This is checked with one
+    boolean forward pass per block (window queries on the prefix sums of the
+    reachable block starts), in O(n * (o_max - o_min + 1) * L), and T is binary
+    searched over the sorted distinct overlap costs. Every block end is allowed
+    (skip size 1), so the cost is the one of the full-resolution DP.
+    
+    INPUTS:
+    -- problem [CutBlocks]: with opt_obj == 'max'
+    
+    OUTPUTS:
+    -- (totalCost, history): same format as dynamicProgramming
+    """
+    if problem.opt_obj != 'max':
+        raise ValueError('thresholdSearch only solves opt_obj == max')
+        
+    L, n = problem.L, problem.n
+    l_min, l_max = problem.l_min, problem.l_max
+    o_list = list(range(problem.o_min, problem.o_max + 1))
+    
+    if n == 1: #no overlap, as in succAndCost
+        return (0, [(L, L, 0, 0)])
+    
+    pos = np.arange(L+1)
+    overlap_cost = overlapCostMatrix(problem)
+        
+    def reachable(threshold):
+        # reach[j, t]: block j+1 can start at t
+        allowed = overlap_cost <= threshold
+        reach = np.zeros((n, L+1), dtype=bool)
+        reach[0, 1] = True
+        for j in range(1, n):
+            reach_cumsum = np.concatenate(([0], np.cumsum(reach[j-1])))
+            for (m, o) in enumerate(o_list):
+                #the block ending at t+o-1 starts in [t+o-l_max, t+o-l_min]
+                s_low = np.clip(pos + o - l_max, 0, L+1)
+                s_high = np.clip(pos + o - l_min, -1, L)
+                reach[j] |= allowed[m] & (reach_cumsum[np.maximum(s_high + 1, s_low)] > reach_cumsum[s_low])
+        return reach
+        
+    def isFeasible(reach):
+        # the last block [t, L]
+        return reach[n-1, max(1, L - l_max + 1): max(1, L - l_min + 2)].any()
+    
+    threshold_list = np.unique(overlap_cost[np.isfinite(overlap_cost)])
+    if len(threshold_list) == 0 or not isFeasible(reachable(threshold_list[-1])):
+        return (np.inf, [])
+    low, high = 0, len(threshold_list) - 1
+    while low < high:
+        mid = (low + high) // 2
+        if isFeasible(reachable(threshold_list[mid])):
+            high = mid
+        else:
+            low = mid + 1
+    totalCost = threshold_list[low]
+    
+    #recover one plan with cost <= totalCost, from the last block backwards
+    reach = reachable(totalCost)
+    t = max(1, L - l_max + 1) + int(np.argmax(reach[n-1, max(1, L - l_max + 1): L - l_min + 2]))
+    step_list = []
+    for j in range(n-1, 0, -1):
+        for (m, o) in enumerate(o_list):
+            s_low, s_high = max(1, t + o - l_max), t + o - l_min
+            if overlap_cost[m, t] <= totalCost and s_low <= s_high and reach[j-1, s_low: s_high+1].any():
+                break
+        step_list.append((t, t + o - 1))
+        t = s_low + int(np.argmax(reach[j-1, s_low: s_high+1]))
+    step_list.reverse()
+    
+    history = [(newState_s, newState_e, n - j - 1, problem.calcuCost(newState_s, newState_e, n - j - 1))
+               for (j, (newState_s, newState_e)) in enumerate(step_list)]
+    history.append((L, L, 0, 0))
+    
+    return (float(totalCost), history)
+    
+    
+    
+def coarseToFine(problem, factor=10, band=2):
+    """
+    MULTI-RESOLUTION SOLVER WITH A BOUND ON THE GAP TO THE FULL-RESOLUTION OPTIMUM
+    --------------------------------------------------
+    1. Coarse DP over bins of `factor` block start positions. The cost of a bin is
+       the cheapest overlap starting in it, and the bin steps allowed between two
+       block starts cover every step of the full-resolution problem, so the coarse
+       optimum is a lower bound of the full-resolution optimum.
+    2. Full-resolution forward DP (skip size 1) where block j+1 may only start
+       within `band` bins of the j-th coarse cut. If no plan is found, the band is
+       doubled (up to the whole track), so a valid plan is always returned.
+    The gap to the full-resolution optimum is at most totalCost - lower_bound.
+    
+    INPUTS:
+    -- problem [CutBlocks]
+    -- factor [int]: number of positions per coarse bin
+    -- band [int]: half width, in coarse bins, of the region refined around a coarse cut
+    
+    OUTPUTS:
+    -- (totalCost, history, lower_bound): history in the same format as dynamicProgramming
+    """
+    L, n = problem.L, problem.n
+    l_min, l_max = problem.l_min, problem.l_max
+    o_list = list(range(problem.o_min, problem.o_max + 1))
+    
+    if n == 1: #no overlap, as in succAndCost
+        return (0, [(L, L, 0, 0)], 0)
+        
+    overlap_cost = overlapCostMatrix(problem)
+    
+    #coarse problem: bin b holds the block starts b*factor+1, ..., (b+1)*factor
+    n_bin = -(-L // factor)
+    bin_cost = np.full(n_bin * factor, np.inf)
+    bin_cost[:L] = overlap_cost[:, 1:].min(axis=0)
+    bin_cost = np.concatenate(([np.inf], bin_cost.reshape(n_bin, factor).min(axis=1)))
+    step_low = -(-(l_min - max(o_list) - factor + 1) // factor)
+    step_high = (l_max - min(o_list) + factor - 1) // factor
+    
+    coarse_cost = np.full(n_bin + 1, np.inf) #bins are 1-based as the positions
+    coarse_cost[1] = 0
+    coarse_s_list = []
+    for j in range(1, n):
+        coarse_cost, coarse_s, _ = forwardLayer(coarse_cost, bin_cost[None, :], [0],
+                                                step_low, step_high, problem.opt_obj)
+        coarse_s_list.append(coarse_s)
+    end_low, end_high = (L - l_max) // factor + 1, (L - l_min) // factor + 1
+    end_bin = end_low + int(np.argmin(coarse_cost[end_low: end_high+1]))
+    lower_bound = coarse_cost[end_bin]
+    if not np.isfinite(lower_bound):
+        return (np.inf, [], np.inf)
+    
+    coarse_cut_list = [end_bin]
+    for j in range(n-2, 0, -1):
+        coarse_cut_list.append(coarse_s_list[j][coarse_cut_list[-1]])
+    coarse_cut_list.reverse()
+    
+    #full resolution, block starts restricted to bands around the coarse cuts
+    pos_bin = np.concatenate(([-1], np.arange(L) // factor + 1))
+    width = band
+    while True:
+        layer_cost = np.full(L+1, np.inf)
+        layer_cost[1] = 0
+        layer_s_list, layer_o_list = [], []
+        for j in range(1, n):
+            layer_cost, layer_s, layer_o = forwardLayer(layer_cost, overlap_cost, o_list,
+                                                        l_min, l_max, problem.opt_obj)
+            layer_cost[np.abs(pos_bin - coarse_cut_list[j-1]) > width] = np.inf
+            layer_s_list.append(layer_s)
+            layer_o_list.append(layer_o)
+        end_low, end_high = max(1, L - l_max + 1), L - l_min + 1
+        t = end_low + int(np.argmin(layer_cost[end_low: end_high+1]))
+        if np.isfinite(layer_cost[t]) or width > n_bin:
+            break
+        width *= 2
+    totalCost = layer_cost[t]
+    if not np.isfinite(totalCost):
+        return (np.inf, [], float(lower_bound))
+    
+    step_list = []
+    for j in range(n-2, -1, -1):
+        step_list.append((t, t + layer_o_list[j][t] - 1))
+        t = layer_s_list[j][t]
+    step_list.reverse()
+    
+    history = [(int(newState_s), int(newState_e), n - j - 1,
+                problem.calcuCost(newState_s, newState_e, n - j - 1))
+               for (j, (newState_s, newState_e)) in enumerate(step_list)]
+    history.append((L, L, 0, 0))
+    
+    return (float(totalCost), history, float(lower_bound))
+    
+    
+    
+def lowerBound(problem):
+    """
+    CHEAP LOWER BOUND OF THE OPTIMAL COST WITH problem.n BLOCKS
+    --------------------------------------------------
+    Block j (j = 0, ..., n-1) starts at t_j with t_0 = 1, consecutive starts are
+    l_min - o_max to l_max - o_min apart, and the last block [t_{n-1}, L] is l_min to
+    l_max long. So overlap j (starting at t_j) can only start in a window known from
+    both ends, and it costs at least the cheapest overlap starting in that window
+    (a range-min query on the cheapest overlap at each start). The bound combines
+    these minima with opt_obj, it is np.inf when a window is empty (no valid plan).
+    
+    OUTPUTS:
+    -- bound [float]: <= the optimal cost of any plan with problem.n blocks
+    """
+    L, n = problem.L, problem.n
+    l_min, l_max = problem.l_min, problem.l_max
+    o_min, o_max = problem.o_min, problem.o_max
+    if n <= 1: #no overlap, as in succAndCost
+        return 0.0
+    
+    if problem.overlap_min_table is None:
+        #cheapest overlap starting at t = 1, ..., L (np.inf if none fits in the track)
+        pos = np.arange(1, L+1)
+        overlap_min = np.full(L, np.inf)
+        for o in range(o_min, o_max + 1):
+            fit = pos + o - 1 <= L
+            overlap_min[fit] = np.minimum(overlap_min[fit], problem.calcuCostArray(pos[fit], pos[fit] + o - 1))
+        problem.overlap_min_table = SparseTable(overlap_min, 'min')
+    
+    j = np.arange(1, n)
+    t_low = np.maximum(1 + j * (l_min - o_max), L - l_max + 1 - (n-1-j) * (l_max - o_min))
+    t_high = np.minimum(1 + j * (l_max - o_min), L - l_min + 1 - (n-1-j) * (l_min - o_max))
+    t_low, t_high = np.maximum(t_low, 1), np.minimum(t_high, L)
+    if (t_high < t_low).any():
+        return np.inf
+    overlap_bound = problem.overlap_min_table.query(t_low - 1, t_high - 1)
+    
+    if problem.opt_obj == 'sum':
+        return float(np.sum(overlap_bound))
+    elif problem.opt_obj == 'max':
+        return float(np.max(overlap_bound))
+    
+    
+    
+def lowerBoundDict(problem, n_min, n_max):
+    # n -> lowerBound for n in [n_min, n_max]
+    n_problem = problem.n
+    bound_dict = dict()
+    for n in range(n_min, n_max+1):
+        problem.n = n
+        bound_dict[n] = lowerBound(problem)
+    problem.n = n_problem
+    return bound_dict
+    
+    
+    
+def isPruned(bound, n, best_cost, best_n):
+    # an n with this lower bound can only tie or lose against the incumbent (ties go to the smaller n)
+    return bound > best_cost or (bound == best_cost and n > best_n)
+    
+    
+    
+def history_to_frag(history):
+    """
+    CONVERT THE HISTORY OF A DP TO THE START AND END POSITIONS OF THE BLOCKS
+    """
+    x_frag_list = [1] + [history[i][0] for i in range(len(history)-1)]
+    y_frag_list = [history[i][1] for i in range(len(history))]
+    
+    return (x_frag_list, y_frag_list)
+    
+    
+    
+def cut_all_n(position_score, n_min, n_max, l_min=1000, l_max=1744, o_min=50, o_max=50, engine='table',
+              cost_type='sum', skip_size_list=(20, 10, 5, 2, 1), opt_obj='max', table=None, prune=False):
+    """
+    OPTIMAL PLAN FOR EVERY NUMBER OF BLOCKS n IN [n_min, n_max] FROM ONE DP
+    --------------------------------------------------
+    The future cost of a state only depends on the block start and on the number of
+    blocks left, not on n. So the table filled for n_max (or the memo of
+    dynamicProgramming) already holds the optimum of every n <= n_max, and each n
+    only costs one traceback.
+    
+    INPUTS:
+    -- engine [str]: 'table' (fillCostTable), 'lowmem' (fillCheckpoints), 'memo' (dynamicProgramming
+       with a shared cache), 'threshold' (thresholdSearch) or 'multires' (coarseToFine), the last two
+       are solved for each n
+    -- table [dict]: a table of fillCostTable ('table' engine) or a state of fillCheckpoints
+       ('lowmem' engine) for n_max to reuse
+    -- prune [bool]: branch and bound, the values of n are solved by increasing lowerBound
+       and skipped when their bound cannot beat the best plan found so far
+    
+    OUTPUTS:
+    -- output_dict [dict]: n -> (totalCost, x_frag_list, y_frag_list),
+       with the lower bound of coarseToFine as a 4th element for 'multires',
+       values of n without a valid plan (or pruned) are left out
+    -- n_pruned [int]: number of pruned values of n, only returned with prune
+    """
+    output_dict = dict()
+    if n_max < n_min:
+        return (output_dict, 0) if prune else output_dict
+    
+    problem = CutBlocks(position_score, n_max, l_min, l_max, o_min, o_max, opt_obj,
+                        cost_type=cost_type, skip_size_list=skip_size_list)
+    n_list = list(range(n_min, n_max+1))
+    if prune:
+        bound_dict = lowerBoundDict(problem, n_min, n_max)
+        n_list = sorted(n_list, key=lambda n: (bound_dict[n], n))
+    n_pruned = 0
+        
+    if engine in ['table', 'lowmem']:
+        if table is None and engine == 'table':
+            table = fillCostTable(problem, bound_dict=bound_dict if prune else None)
+        elif table is None:
+            table = fillCheckpoints(problem, bound_dict=bound_dict if prune else None)
+        n_pruned = sum(n > table['n_filled'] for n in n_list)
+    elif engine == 'memo':
+        cache = {}
+    elif engine in ['threshold', 'multires']:
+        pass
+    else:
+        raise ValueError('unknown engine: {}'.format(engine))
+        
+    for n in n_list:
+        if prune and engine in ['table', 'lowmem'] and n > table['n_filled']: #counted above
+            continue
+        if prune and engine in ['memo', 'threshold', 'multires'] and (not np.isfinite(bound_dict[n])
+                                            or (len(output_dict) > 0
+                                                and isPruned(bound_dict[n], n, *min((output_dict[i][0], i)
+                                                                                    for i in output_dict.keys())))):
+            n_pruned += 1
+            continue
+                
+        if engine == 'table':
+            totalCost, history = tracebackCostTable(table, n)
+        elif engine == 'lowmem':
+            totalCost, history = tracebackCheckpoints(table, n)
+        elif engine == 'memo':
+            problem.n = n
+            totalCost, history = dynamicProgramming(problem, cache)
+        elif engine == 'threshold':
+            problem.n = n
+            totalCost, history = thresholdSearch(problem)
+        elif engine == 'multires':
+            problem.n = n
+            totalCost, history, lower_bound = coarseToFine(problem)
+            
+        if np.isfinite(totalCost):
+            output_dict[n] = (totalCost,) + history_to_frag(history)
+            if engine == 'multires':
+                output_dict[n] += (lower_bound,)
+            
+    return (output_dict, n_pruned) if prune else output_dict
+    
 
 
-def cut_fixed_n(position_score, n, l_min=1000, l_max=1744, o_min=50, o_max=50):
+def cut_k_best(position_score, n_min, n_max, n_plans, l_min=1000, l_max=1744, o_min=50, o_max=50,
+               cost_type='sum', skip_size_list=(20, 10, 5, 2, 1), opt_obj='max', table=None):
     """
+    THE n_plans CHEAPEST DISTINCT PLANS OVER ALL n IN [n_min, n_max] FROM ONE DP
+    --------------------------------------------------
+    One fillCostTable for n_max with n_best = n_plans holds the n_plans best plans
+    of every n <= n_max, the overall best ones are picked among them and traced back.
+    
+    INPUTS:
+    -- table [dict]: a table of fillCostTable for n_max with n_best >= n_plans to reuse
+    
+    OUTPUTS:
+    -- plan_list [list]: (totalCost, n, x_frag_list, y_frag_list) ranked by cost, then n,
+       at most n_plans plans, the first one is the optimum of cut_all_n
+    """
+    if n_max < n_min:
+        return []
+    
+    if table is None:
+        problem = CutBlocks(position_score, n_max, l_min, l_max, o_min, o_max, opt_obj,
+                            cost_type=cost_type, skip_size_list=skip_size_list)
+        table = fillCostTable(problem, n_best=n_plans)
+    
+    ranked = sorted((table['cost'][n, 1, rank], n, rank) for n in range(n_min, n_max+1)
+                                                          for rank in range(n_plans)
+                                                          if np.isfinite(table['cost'][n, 1, rank]))
+    plan_list = []
+    for _, n, rank in ranked[:n_plans]:
+        totalCost, history = tracebackCostTable(table, n, rank)
+        plan_list.append((totalCost, n) + history_to_frag(history))
+        
+    return plan_list
+    
+    
+    
+def cut_fixed_n(position_score, n, l_min=1000, l_max=1744, o_min=50, o_max=50, engine='table',
+                cost_type='sum', skip_size_list=(20, 10, 5, 2, 1), opt_obj='max'):
+    """
+    engine [str]: 'table' (tabulatedDynamicProgramming), 'lowmem' (fillCheckpoints), 'memo' (dynamicProgramming),
+    'threshold' (thresholdSearch, opt_obj == 'max' only) or 'multires' (coarseToFine),
+    tracks longer than L_PART always use streamingDynamicProgramming
+    cost_type [str], skip_size_list [list], opt_obj [str]: see CutBlocks
     """
     L = len(position_score)
-    L_part = 100000
+    L_part = L_PART
     
     if L <= L_part:
-        problem = CutBlocks(position_score, n, l_min, l_max, o_min, o_max)
-        totalCost, history = dynamicProgramming(problem)
+        problem = CutBlocks(position_score, n, l_min, l_max, o_min, o_max, opt_obj,
+                            cost_type=cost_type, skip_size_list=skip_size_list)
+        if engine == 'table':
+            totalCost, history = tabulatedDynamicProgramming(problem)
+        elif engine == 'lowmem':
+            totalCost, history = tracebackCheckpoints(fillCheckpoints(problem), n)
+        elif engine == 'memo':
+            totalCost, history = dynamicProgramming(problem)
+        elif engine == 'threshold':
+            totalCost, history = thresholdSearch(problem)
+        elif engine == 'multires':
+            totalCost, history, _ = coarseToFine(problem)
+        else:
+            raise ValueError('unknown engine: {}'.format(engine))
 
-        x_frag_list = [1] + [history[i][0] for i in range(len(history)-1)]
-        y_frag_list = [history[i][1] for i in range(len(history))]
+        x_frag_list, y_frag_list = history_to_frag(history)
         
-    elif L <= 2*L_part: # not finish yet
-        problem = CutBlocks(position_score[:L_part], n)
-        print('\nRunning 1st DNA cuts algorithm ...')
-        totalCost, history = dynamicProgramming(problem)
-
-        x_frag_list = [1] + [history[i][0] for i in range(len(history)-1)]
-        y_frag_list = [history[i][1] for i in range(len(history))]
-        len_frag_list = [y_frag_list[i] - x_frag_list[i] for i in range(len(x_frag_list))]
+    else: #streaming over windows of the score track
+        totalCost, x_frag_list, y_frag_list = streamingDynamicProgramming(position_score, n, n,
+                                                                          l_min, l_max, o_min, o_max,
+                                                                          opt_obj, cost_type)
+    
+    return (totalCost, x_frag_list, y_frag_list)
+    
+    
+def _cut_n_worker(score_source, L, n, kwargs):
+    """
+    SOLVE ONE n IN A WORKER OF cut_n_parallel
+    --------------------------------------------------
+    score_source is the name of a shared memory block holding the score (process pool)
+    or the score itself (thread pool), kwargs are the arguments of cut_all_n.
+    """
+    if not isinstance(score_source, str):
+        return cut_all_n(score_source, n, n, **kwargs)
+    
+    shm = shared_memory.SharedMemory(name=score_source)
+    try:
+        return cut_all_n(np.ndarray((L,), dtype=float, buffer=shm.buf), n, n, **kwargs)
+    finally:
+        shm.close()
         
-        tmp = [(k, ele) for (k, ele) in enumerate(x_frag_list) if (L - ele) < L_part][0] ###
-        problem = CutBlocks(position_score[tmp[1]-1:])
-        print('\nRunning 2nd DNA cuts algorithm ...')
-        totalCost, history = dynamicProgramming(problem)
         
-        x_frag_list = x_frag_list[:tmp[0]] + [1 + tmp[1] - 1] + [history[i][0] + tmp[1] for i in range(len(history)-1)]
-        y_frag_list = y_frag_list[:tmp[0]] + [history[i][1] + tmp[1] - 1 for i in range(len(history))]
+def cut_n_parallel(position_score, n_min, n_max, l_min=1000, l_max=1744, o_min=50, o_max=50, engine='table',
+                   cost_type='sum', skip_size_list=(20, 10, 5, 2, 1), opt_obj='max', n_jobs=-1):
+    """
+    SOLVE THE NUMBERS OF BLOCKS n IN [n_min, n_max] CONCURRENTLY
+    --------------------------------------------------
+    Each n is solved on its own with cut_all_n(n, n) in a process pool, the score is put
+    once in shared memory and read by all workers. This pays off for the engines that
+    solve each n separately anyway ('memo', 'threshold', 'multires'): one table of
+    fillCostTable or one pass of streamingDynamicProgramming already covers all n, and
+    splitting them per n multiplies the work. Values of n are submitted by increasing
+    lowerBound, n_jobs at a time, and a value of n is cancelled before it starts when its
+    lower bound cannot beat the best plan found so far.
+    Inside a daemonic process (e.g. a worker of order_main.submain_parallel) no child
+    process can be started, so a thread pool is used instead.
     
-    return (totalCost, x_frag_list, y_frag_list)
+    INPUTS:
+    -- n_jobs [int]: number of workers, -1 for all cores
+    
+    OUTPUTS:
+    -- output_dict [dict]: same as cut_all_n, without the cancelled values of n
+    -- n_cancelled [int]: number of cancelled values of n
+    """
+    output_dict = dict()
+    if n_max < n_min:
+        return output_dict, 0
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    
+    L = len(position_score)
+    score = np.asarray(position_score, dtype=float)
+    kwargs = {'l_min': l_min, 'l_max': l_max, 'o_min': o_min, 'o_max': o_max, 'engine': engine,
+              'cost_type': cost_type, 'skip_size_list': skip_size_list, 'opt_obj': opt_obj}
+    
+    problem = CutBlocks(score, n_max, l_min, l_max, o_min, o_max, opt_obj,
+                        cost_type=cost_type, skip_size_list=skip_size_list)
+    bound_dict = lowerBoundDict(problem, n_min, n_max)
+    n_list = sorted(bound_dict.keys(), key=lambda n: (bound_dict[n], n))
+    
+    shm = None
+    if in_daemon_process():
+        executor = ThreadPoolExecutor(max_workers=n_jobs)
+        score_source = score
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(1, score.nbytes))
+        np.ndarray(score.shape, dtype=float, buffer=shm.buf)[:] = score
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+        score_source = shm.name
+        
+    n_cancelled = 0
+    running_dict = dict()
+    try:
+        while len(n_list) > 0 or len(running_dict) > 0:
+            #keep n_jobs values of n running, a value of n that can only tie or lose against
+            #the incumbent is cancelled before it starts
+            while len(n_list) > 0 and len(running_dict) < n_jobs:
+                n = n_list.pop(0)
+                if not np.isfinite(bound_dict[n]) or (len(output_dict) > 0
+                                                      and isPruned(bound_dict[n], n, *min((output_dict[i][0], i)
+                                                                                          for i in output_dict.keys()))):
+                    n_cancelled += 1
+                    continue
+                running_dict[executor.submit(_cut_n_worker, score_source, L, n, kwargs)] = n
+            if len(running_dict) == 0:
+                break
+                
+            done, _ = wait(running_dict, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running_dict[future]
+                output_dict.update(future.result())
+    finally:
+        executor.shutdown(wait=True)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+            
+    return output_dict, n_cancelled
     
     
-def cut(position_score, n_max=10, l_min=1000, l_max=1744, o_min=50, o_max=50, print_option=True):
+def cut(position_score, n_max=10, l_min=1000, l_max=1744, o_min=50, o_max=50, print_option=True, engine='table',
+        cost_type='sum', skip_size_list=(20, 10, 5, 2, 1), opt_obj='max', n_plans=1, dp_state=None, n_jobs=1,
+        prune=True):
     """
+    prune [bool]: branch and bound over n with lowerBound (see fillCostTable and cut_all_n),
+    result_dict['cancelled_n'] is the number of values of n that were not solved (L <= L_PART only)
+    n_jobs [int]: with n_jobs != 1, the values of n are solved concurrently by cut_n_parallel
+    (-1 for all cores), for the engines 'memo', 'threshold' and 'multires' and L <= L_PART
+    n_plans [int]: with n_plans > 1, result_dict['alternative_plans'] lists the n_plans cheapest
+    distinct plans (the optimal one first) from the same DP, 'table' engine and L <= L_PART only
+    dp_state [dict]: with the 'table' engine and L <= L_PART, result_dict['dp_state'] keeps the
+    filled table, recut uses it to update the plan after a local change of the score
     """
     t_start = time.time()
+    
+    param = {'n_max': n_max, 'l_min': l_min, 'l_max': l_max, 'o_min': o_min, 'o_max': o_max,
+             'engine': engine, 'cost_type': cost_type, 'skip_size_list': skip_size_list,
+             'opt_obj': opt_obj, 'n_plans': n_plans, 'n_jobs': n_jobs, 'prune': prune}
         
     L = len(position_score)
     n_min = int(np.ceil((L - o_min) / (l_max - o_min)))
@@ -165,9 +1309,54 @@ def cut(position_score, n_max=10, l_min=1000, l_max=1744, o_min=50, o_max=50, pr
     my_print('         length for a fragment: [{}, {}]'.format(l_min, l_max), print_option)
     my_print('         overlap between two fragments: [{}, {}]'.format(o_min, o_max), print_option)
         
-    output_dict = dict()
-    for n in range(n_min, n_max+1):
-        output_dict[n] = cut_fixed_n(position_score, n, l_min, l_max, o_min, o_max)
+    plan_list = None
+    n_pruned = None
+    if n_plans > 1 and (engine != 'table' or L > L_PART):
+        my_print('         alternative plans need the table engine and a length <= {}'.format(L_PART), print_option)
+    if L > L_PART:
+        my_print('         length > {}: streaming DP (approximate), engine, skip_size_list, n_jobs and prune are not used'.format(L_PART),
+                 print_option)
+    if n_jobs != 1 and L <= L_PART and (engine not in ['memo', 'threshold', 'multires'] or n_plans > 1):
+        my_print('         n_jobs is only used by the engines memo, threshold and multires (without alternative plans)',
+                 print_option)
+    
+    if engine == 'table' and L <= L_PART and dp_state is None: #the table is kept for recut
+        problem = CutBlocks(position_score, n_max, l_min, l_max, o_min, o_max, opt_obj,
+                            cost_type=cost_type, skip_size_list=skip_size_list)
+        bound_dict = lowerBoundDict(problem, n_min, n_max) if prune else None
+        dp_state = {'table': fillCostTable(problem, max(1, n_plans), bound_dict),
+                    'param': param}
+    if engine == 'table' and L <= L_PART:
+        n_pruned = sum(n > dp_state['table']['n_filled'] for n in range(n_min, n_max+1))
+    
+    if n_plans > 1 and engine == 'table' and L <= L_PART: #one k-best DP for all n
+        plan_list = cut_k_best(position_score, n_min, n_max, n_plans, l_min, l_max, o_min, o_max,
+                               cost_type, skip_size_list, opt_obj, dp_state['table'])
+        output_dict = {plan_list[0][1]: (plan_list[0][0],) + plan_list[0][2:]} if len(plan_list) > 0 else {}
+    elif n_jobs != 1 and engine in ['memo', 'threshold', 'multires'] and L <= L_PART: #one n per worker
+        output_dict, n_pruned = cut_n_parallel(position_score, n_min, n_max, l_min, l_max, o_min, o_max,
+                                               engine, cost_type, skip_size_list, opt_obj, n_jobs)
+    elif L <= L_PART and engine == 'table': #one DP for all n
+        output_dict = cut_all_n(position_score, n_min, n_max, l_min, l_max, o_min, o_max, engine,
+                                cost_type, skip_size_list, opt_obj, dp_state['table'])
+    elif L <= L_PART and engine == 'lowmem': #one DP for all n, only the best n is traced back
+        problem = CutBlocks(position_score, n_max, l_min, l_max, o_min, o_max, opt_obj,
+                            cost_type=cost_type, skip_size_list=skip_size_list)
+        state = fillCheckpoints(problem, bound_dict=lowerBoundDict(problem, n_min, n_max) if prune else None)
+        n_pruned = sum(n > state['n_filled'] for n in range(n_min, n_max+1))
+        n_best = min(range(n_min, n_max+1), key=lambda n: (state['cost'][n], n), default=n_min)
+        output_dict = cut_all_n(position_score, n_best, min(n_best, n_max), l_min, l_max, o_min, o_max, engine,
+                                cost_type, skip_size_list, opt_obj, state)
+    elif L <= L_PART:
+        output_dict = cut_all_n(position_score, n_min, n_max, l_min, l_max, o_min, o_max, engine,
+                                cost_type, skip_size_list, opt_obj, prune=prune)
+        if prune:
+            output_dict, n_pruned = output_dict
+    else: #one streaming DP, the number of blocks is chosen in the same pass
+        totalCost, x_frag_list, y_frag_list = streamingDynamicProgramming(position_score, n_min, n_max,
+                                                                          l_min, l_max, o_min, o_max,
+                                                                          opt_obj, cost_type)
+        output_dict = {len(x_frag_list): (totalCost, x_frag_list, y_frag_list)} if len(x_frag_list) > 0 else {}
                 
     (totalCost_opt, n_opt, x_frag_opt, y_frag_opt) = min((output_dict[i][0],
                                                           i,
@@ -179,15 +1368,62 @@ def cut(position_score, n_max=10, l_min=1000, l_max=1744, o_min=50, o_max=50, pr
     t_end = time.time()
     
     my_print('      2) optimized cost: {}'.format(totalCost_opt), print_option)
+    if n_pruned is not None:
+        my_print('         values of n pruned by their lower bound: {} of {}'.format(n_pruned, max(0, n_max - n_min + 1)),
+                 print_option)
+    if engine == 'multires' and L <= L_PART:
+        #the optimum over all n is at least the smallest lower bound over all n
+        lower_bound = min(output_dict[i][3] for i in output_dict.keys())
+        my_print('         lower bound: {}, gap: {}'.format(lower_bound, totalCost_opt - lower_bound), print_option)
     my_print('      3) result:', print_option)
     for i in range(len(x_frag_opt)):
         my_print('         {}: pos=[{}, {}], len={}'.format(i+1, x_frag_opt[i], y_frag_opt[i], len_frag_opt[i]), print_option)
+    if plan_list is not None:
+        my_print('      4) alternative plans:', print_option)
+        for i, (totalCost, n, x_frag_list, y_frag_list) in enumerate(plan_list[1:]):
+            my_print('         {}: cost={}, n={}, start={}'.format(i+2, totalCost, n, x_frag_list), print_option)
         
 
     result_dict = {'optimal_cost': totalCost_opt,
                    'block_number': n_opt,
                    'start_pos': x_frag_opt,
                    'end_pos': y_frag_opt}
+    if engine == 'multires' and L <= L_PART:
+        result_dict['lower_bound'] = lower_bound
+        result_dict['gap'] = totalCost_opt - lower_bound
+    if plan_list is not None:
+        result_dict['alternative_plans'] = [{'cost': totalCost,
+                                             'block_number': n,
+                                             'start_pos': x_frag_list,
+                                             'end_pos': y_frag_list}
+                                            for (totalCost, n, x_frag_list, y_frag_list) in plan_list]
+    if n_pruned is not None:
+        result_dict['cancelled_n'] = n_pruned
+    if engine == 'table' and L <= L_PART:
+        result_dict['dp_state'] = dp_state
+    
+    return result_dict
+    
+    
+def recut(dp_state, position_score, change_start, change_end, print_option=True):
+    """
+    INCREMENTAL cut AFTER THE SCORE TRACK CHANGED ON [change_start, change_end]
+    --------------------------------------------------
+    The table of the previous cut is updated with updateCostTable (only the states
+    that depend on the changed positions are recomputed), then traced back again.
+    
+    INPUTS:
+    -- dp_state [dict]: result_dict['dp_state'] of the previous cut or recut, updated in place
+    -- position_score [list]: the new score track, same length as before
+    -- change_start, change_end [int]: the changed positions, 1-based, inclusive
+    
+    OUTPUTS:
+    -- result_dict [dict]: same as cut, plus 'recomputed_states'
+    """
+    n_recomputed = updateCostTable(dp_state['table'], position_score, change_start, change_end)
+    
+    result_dict = cut(position_score, print_option=print_option, dp_state=dp_state, **dp_state['param'])
+    result_dict['recomputed_states'] = n_recomputed
     
     return result_dict
     
@@ -213,6 +1449,12 @@ def main():
                         
     parser.add_argument('-nm', '--number_max', nargs='*', type=int, default = 10,
                         help='maximum number of fragments allowed')
+    
+    parser.add_argument('-e', '--engine', type=str, default='table', choices=['table', 'lowmem', 'memo', 'threshold', 'multires'],
+                        help='dynamic programming engine (lowmem: O(L) memory, threshold: minimax objective only)')
+    
+    parser.add_argument('-ob', '--opt_obj', type=str, default='max', choices=['max', 'sum'],
+                        help='minimize the maximum or the sum of the overlap costs')
         
     args = parser.parse_args()
     
@@ -236,9 +1478,14 @@ def main():
     print('o_min: {}, o_max: {}'.format(o_min, o_max))
     print('n_min: {}, n_max: {}'.format(n_min, n_max))
     
-    output_dict = dict()
-    for n in range(n_min, n_max+1):
-        output_dict[n] = cut_fixed_n(position_score, n, l_min, l_max, o_min, o_max)
+    if L <= L_PART: #one DP for all n
+        output_dict = cut_all_n(position_score, n_min, n_max, l_min, l_max, o_min, o_max, args.engine,
+                                opt_obj=args.opt_obj)
+    else: #one streaming DP, the number of blocks is chosen in the same pass
+        totalCost, x_frag_list, y_frag_list = streamingDynamicProgramming(position_score, n_min, n_max,
+                                                                          l_min, l_max, o_min, o_max,
+                                                                          args.opt_obj)
+        output_dict = {len(x_frag_list): (totalCost, x_frag_list, y_frag_list)} if len(x_frag_list) > 0 else {}
                 
     (totalCost_opt, n_opt, x_frag_opt, y_frag_opt) = min((output_dict[i][0], i, output_dict[i][1], output_dict[i][2])
                                                          for i in output_dict.keys())
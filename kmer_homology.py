@@ -0,0 +1,259 @@
+import numpy as np
+
+
+
+CODE_TABLE = np.full(256, 4, dtype=np.uint8)
+for (k, base) in enumerate('ACGT'):
+    CODE_TABLE[ord(base)] = k
+    CODE_TABLE[ord(base.lower())] = k
+#A=0, C=1, G=2, T=3, any other character (N, ...) 4, which never matches
+
+K_UNGAPPED = 0.46
+#Karlin-Altschul K of the ungapped (reward 1, penalty -2) scoring system, used for all systems
+
+X_DROP_BITS = 20
+#X-drop of the ungapped extension in bits (as blastn)
+
+MAX_SEED_COUNT = 50
+#k-mers found more than MAX_SEED_COUNT times in the subject are not used as seeds
+
+
+
+def encode(sequence):
+    """
+    ENCODE A DNA SEQUENCE AS np.uint8 (A=0, C=1, G=2, T=3, OTHER=4)
+    """
+    return CODE_TABLE[np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)]
+
+
+
+def reverse_complement(code):
+    """
+    REVERSE COMPLEMENT OF AN ENCODED SEQUENCE (OTHER STAYS OTHER)
+    """
+    code = code[::-1]
+    return np.where(code < 4, 3 - code, code).astype(np.uint8)
+
+
+
+def kmer_hash(code, k):
+    """
+    HASH (2 BITS PER BASE) OF EVERY k-MER
+    --------------------------------------------------
+    INPUTS:
+    -- code [np.array]: encoded sequence
+    -- k [int]: word size
+
+    OUTPUTS:
+    -- kmer [np.array]: hash of the k-mer starting at each position (len(code) - k + 1)
+    -- valid [np.array]: whether the k-mer has no other base (N, ...)
+    """
+    n_kmer = len(code) - k + 1
+    if n_kmer <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+    kmer = np.zeros(n_kmer, dtype=np.int64)
+    n_other = np.zeros(n_kmer, dtype=np.int64)
+    for m in range(k):
+        kmer = (kmer << 2) | (code[m: m+n_kmer] & 3)
+        n_other += code[m: m+n_kmer] == 4
+
+    return kmer, n_other == 0
+
+
+
+def ungapped_lambda(reward, penalty):
+    """
+    KARLIN-ALTSCHUL LAMBDA OF AN UNGAPPED (reward, penalty) SCORING SYSTEM
+    WITH UNIFORM BASE FREQUENCIES: 1/4 exp(lambda reward) + 3/4 exp(lambda penalty) = 1
+    """
+    low, high = 1e-6, 10.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        if 0.25 * np.exp(mid * reward) + 0.75 * np.exp(mid * penalty) > 1:
+            high = mid
+        else:
+            low = mid
+
+    return (low + high) / 2
+
+
+
+def seed_pairs(query_code, subject_code, k, max_count=MAX_SEED_COUNT):
+    """
+    ALL EXACT k-MER MATCHES BETWEEN QUERY AND SUBJECT
+    --------------------------------------------------
+    The subject k-mers are sorted once, the range of each query k-mer is found by
+    np.searchsorted and the pairs are expanded without a Python loop.
+    k-mers found more than max_count times in the subject are masked, so the number
+    of pairs is at most max_count per query k-mer (low-complexity and tandem repeats
+    would otherwise give a number of pairs quadratic in their length).
+
+    OUTPUTS:
+    -- pos_q [np.array]: start of the k-mer in the query
+    -- pos_s [np.array]: start of the k-mer in the subject
+    """
+    kmer_q, valid_q = kmer_hash(query_code, k)
+    kmer_s, valid_s = kmer_hash(subject_code, k)
+    pos_q = np.flatnonzero(valid_q)
+    pos_s_valid = np.flatnonzero(valid_s)
+
+    order = np.argsort(kmer_s[pos_s_valid], kind='stable')
+    kmer_s_sorted = kmer_s[pos_s_valid][order]
+    left = np.searchsorted(kmer_s_sorted, kmer_q[pos_q], side='left')
+    right = np.searchsorted(kmer_s_sorted, kmer_q[pos_q], side='right')
+    count = right - left
+    count[count > max_count] = 0
+
+    pos_q = np.repeat(pos_q, count)
+    offset = np.arange(len(pos_q)) - np.repeat(np.cumsum(count) - count, count)
+    pos_s = pos_s_valid[order[np.repeat(left, count) + offset]]
+
+    return pos_q, pos_s
+
+
+
+def extend(query_code, subject_code, q_start, s_start, direction, reward, penalty, x_drop):
+    """
+    UNGAPPED X-DROP EXTENSION FROM (q_start, s_start) TO THE LEFT (direction=-1, the
+    positions before) OR TO THE RIGHT (direction=1, the positions from q_start)
+    --------------------------------------------------
+    The scores are evaluated in chunks of doubling length until the running score
+    drops x_drop below its maximum or a sequence ends.
+
+    OUTPUTS:
+    -- length [int]: number of positions added
+    -- score [int or float]: score of the extension (0 if length is 0)
+    """
+    if direction > 0:
+        n_max = min(len(query_code) - q_start, len(subject_code) - s_start)
+    else:
+        n_max = min(q_start, s_start)
+
+    chunk = 32
+    while True:
+        n = min(chunk, n_max)
+        if direction > 0:
+            seg_q = query_code[q_start: q_start+n]
+            seg_s = subject_code[s_start: s_start+n]
+        else:
+            seg_q = query_code[q_start-n: q_start][::-1]
+            seg_s = subject_code[s_start-n: s_start][::-1]
+        score = np.cumsum(np.where((seg_q == seg_s) & (seg_q < 4), reward, penalty))
+        score_max = np.maximum.accumulate(np.maximum(score, 0))
+        drop = np.flatnonzero(score_max - score > x_drop)
+        if len(drop) > 0 or n == n_max:
+            if len(drop) > 0:
+                score = score[:drop[0]]
+            if len(score) == 0 or np.max(score) <= 0:
+                return 0, 0
+            best = int(np.argmax(score))
+            return best + 1, score[best].item()
+        chunk *= 2
+
+
+
+def ungapped_hsps(query_code, subject_code, k, reward, penalty, x_drop):
+    """
+    UNGAPPED HSPs OF QUERY AND SUBJECT (SAME STRAND) FROM k-MER SEEDS
+    --------------------------------------------------
+    Seeds are grouped by diagonal; consecutive seeds of a diagonal are one exact run
+    and are extended once. A run inside the HSP of a previous run of the same
+    diagonal is skipped.
+
+    OUTPUTS:
+    -- hsp_list [list]: (score, query start, query end, subject start, subject end),
+       0-based, ends included
+    """
+    pos_q, pos_s = seed_pairs(query_code, subject_code, k)
+    if len(pos_q) == 0:
+        return []
+
+    diagonal = pos_s - pos_q
+    order = np.lexsort((pos_q, diagonal))
+    pos_q, diagonal = pos_q[order], diagonal[order]
+    run_start = np.flatnonzero(np.concatenate(([True], (diagonal[1:] != diagonal[:-1]) |
+                                                      (pos_q[1:] != pos_q[:-1] + 1))))
+    run_end = np.append(run_start[1:], len(pos_q)) - 1
+
+    hsp_list = []
+    diagonal_prev, covered = None, -1
+    for (r_start, r_end) in zip(run_start, run_end):
+        d = int(diagonal[r_start])
+        q_first, q_last = int(pos_q[r_start]), int(pos_q[r_end]) + k - 1 #exact match of the run
+        if d == diagonal_prev and q_last <= covered:
+            continue
+
+        n_left, score_left = extend(query_code, subject_code, q_first, q_first + d, -1, reward, penalty, x_drop)
+        n_right, score_right = extend(query_code, subject_code, q_last + 1, q_last + 1 + d, 1, reward, penalty, x_drop)
+        q_start, q_end = q_first - n_left, q_last + n_right
+        score = (q_last - q_first + 1) * reward + score_left + score_right
+        hsp_list.append((score, q_start, q_end, q_start + d, q_end + d))
+        diagonal_prev, covered = d, q_end
+
+    return hsp_list
+
+
+
+def search(query, subject_list, word_size, reward, penalty, perc_identity, evalue):
+    """
+    k-MER SEED AND UNGAPPED EXTENSION HOMOLOGY SEARCH, A BUILT-IN ALTERNATIVE TO blastn
+    --------------------------------------------------
+    Both strands of each subject are searched. HSPs are kept if their E-value,
+    K m n exp(-lambda score) with n the total length of the subjects, is at most
+    evalue and their percent identity at least perc_identity. Unlike blastn, there
+    is no gapped extension and, instead of the low-complexity (DUST) filter, k-mers
+    found more than MAX_SEED_COUNT times in a subject strand are not used as seeds,
+    and K is the one of the (1, -2) scoring system.
+
+    INPUTS:
+    -- query [str]: a DNA sequence
+    -- subject_list [list]: DNA sequences to search
+    -- word_size, reward, penalty, perc_identity, evalue: as the blastn options
+
+    OUTPUTS:
+    -- result [list]: a list of tuples, as CalculateScore.make_blast_single
+       (score, align length, query start, query end, subject start, subject end,
+       (query strand, subject strand), query, match, subject, identity), 1-based,
+       subject start > subject end on the minus strand, ordered by subject (best
+       HSP first) and by score within a subject
+    """
+    lambda_ = ungapped_lambda(reward, -abs(penalty))
+    x_drop = X_DROP_BITS * np.log(2) / lambda_
+    query_code = encode(query)
+    n_total = sum(len(subject) for subject in subject_list)
+
+    alignment_list = []
+    for subject in subject_list:
+        subject_code = encode(subject)
+        hsp_result = []
+        for strand in ['Plus', 'Minus']:
+            code = subject_code if strand == 'Plus' else reverse_complement(subject_code)
+            for (score, q_start, q_end, s_start, s_end) in ungapped_hsps(query_code, code, word_size,
+                                                                         reward, -abs(penalty), x_drop):
+                if K_UNGAPPED * len(query) * n_total * np.exp(-lambda_ * score) > evalue:
+                    continue
+                seg_q = query_code[q_start: q_end+1]
+                seg_s = code[s_start: s_end+1]
+                is_match = (seg_q == seg_s) & (seg_q < 4)
+                identity = float(np.mean(is_match))
+                if 100 * identity < perc_identity:
+                    continue
+
+                query_str = query[q_start: q_end+1]
+                if strand == 'Plus':
+                    sbjct_str = subject[s_start: s_end+1]
+                    s_first, s_last = s_start + 1, s_end + 1
+                else:
+                    sbjct_str = ''.join('ACGTN'[c] for c in seg_s)
+                    s_first, s_last = len(subject) - s_start, len(subject) - s_end
+                match_str = ''.join('|' if m else ' ' for m in is_match)
+                hsp_result.append((score, q_end - q_start + 1, q_start + 1, q_end + 1, s_first, s_last,
+                                   ('Plus', strand), query_str, match_str, sbjct_str, identity))
+        if len(hsp_result) > 0:
+            alignment_list.append(sorted(hsp_result, key=lambda hsp: -hsp[0]))
+
+    alignment_list.sort(key=lambda hsp_result: -hsp_result[0][0])
+    result = [hsp for hsp_result in alignment_list for hsp in hsp_result]
+
+    return result
@@ -39,28 +39,39 @@ class OrderMain(object):
         self.o_min = int(self.param_dict['min_overlapping'])
         self.o_max = int(self.param_dict['max_overlapping'])
         self.n_max = int(self.param_dict['max_number'])
+        self.n_plans = int(self.param_dict.get('plan_number', 1))
+        #number of cut plans kept for each sequence, the optimal one and the next best ones as fallback
+        self.cut_engine = self.param_dict.get('cut_engine', 'table')
+        self.cut_jobs = int(self.param_dict.get('cut_jobs', 1))
+        #DP engine of find_cut.cut, and number of workers solving the numbers of blocks concurrently
             
         self.dir_output = self.param_dict['output_directory']
         
+        if self.n_plans > 1:
+            self.dir_plan = '{}cut_plans/'.format(self.dir_output)
+            #folder for the alternative cut plans
+            if not os.path.exists(self.dir_plan):
+                os.mkdir(self.dir_plan)
+        
         score_option = self.param_dict['score_option']
         if 'BLAST' in score_option: #BLAST
             use_BLAST = True
         else:
             use_BLAST = False
             
+        self.blast_batch = (use_BLAST and 'BLAST_KMER' not in score_option and
+                            json.loads(self.param_dict.get('blast_batch', 'false').lower()))
+        #one blastn call for all sequences of the experiment (calculate_score.blast_batch), not for BLAST_KMER
+            
         if use_BLAST:
             dir_blast = '{}blast_result/'.format(self.dir_output)
             #folder for BLAST result
             dir_blast_database = '{}database/'.format(dir_blast)
             #folder for database in BLAST
-            dir_blast_tmp = '{}tmp/'.format(dir_blast)
-            #folder for temporary in BLAST
             if not os.path.exists(dir_blast):
                 os.mkdir(dir_blast)
             if not os.path.exists(dir_blast_database):
                 os.mkdir(dir_blast_database)
-            if not os.path.exists(dir_blast_tmp):
-                os.mkdir(dir_blast_tmp)
                 
                 
                 
@@ -75,15 +86,16 @@ class OrderMain(object):
         
         
     
-    def process_target_single(self, sequence, label):
+    def process_target_single(self, sequence, label, blast_hits=None):
         """
         FUNCTION FOR PROCESSING EACH DNA SEQUENCE IN A FASTA FILE
         ----------------------------------------
         INPUTS:
         -- option [str]: 'all', 'score_only'
+        -- blast_hits [pd.DataFrame]: plasmid hits of the sequence from calculate_score.blast_batch
         """
         my_print('   -- Calculating position score...', not self.parallel)
-        score_dict = calculate_score.score(sequence, self.param_dict, label)
+        score_dict = calculate_score.score(sequence, self.param_dict, label, blast_hits)
         score_result = score_dict['summed_score']
         
         ####################
@@ -104,7 +116,15 @@ class OrderMain(object):
                                               l_max = self.l_max,
                                               o_min = self.o_min,
                                               o_max = self.o_max,
-                                              print_option = not self.parallel)
+                                              print_option = not self.parallel,
+                                              n_plans = self.n_plans,
+                                              engine = self.cut_engine,
+                                              n_jobs = self.cut_jobs)
+        
+        if 'alternative_plans' in cut_dict: #ranked plans, a rejected plan can be replaced without re-running
+            plan_df = pd.DataFrame(cut_dict['alternative_plans'])
+            plan_df.index.name = 'rank'
+            plan_df.to_csv('{}{}_cut_plans.csv'.format(self.dir_plan, label))
                                                       
         cut_result = [cut_dict['start_pos'], cut_dict['end_pos']]
         
@@ -127,8 +147,6 @@ def submain(parameter_csv):
     input_file = param_dict['input_file']
     
     dir_output = param_dict['output_directory']
-    dir_blast = '{}blast_result/'.format(dir_output)
-    dir_blast_tmp = '{}tmp/'.format(dir_blast)
     dir_worksheet = '{}worksheet/'.format(dir_output)
     if not os.path.exists(dir_worksheet):
         os.mkdir(dir_worksheet)
@@ -154,12 +172,20 @@ def submain(parameter_csv):
                 'adapter_right'])
                 
     my_object = OrderMain(parameter_csv)
-    for record in SeqIO.parse(input_file, 'fasta'):
+    record_list = list(SeqIO.parse(input_file, 'fasta'))
+    if my_object.blast_batch:
+        print('BLAST for all sequences...')
+        blast_hits_dict = calculate_score.blast_batch([record.id for record in record_list],
+                                                      [str(record.seq) for record in record_list],
+                                                      param_dict)
+    else:
+        blast_hits_dict = dict()
+    for record in record_list:
         label = record.id
         sequence = str(record.seq)
         print('\n----------------------------------------' )
         print('-- For sequence with label "{}"...'.format(label))
-        output_single = my_object.process_target_single(sequence, label)
+        output_single = my_object.process_target_single(sequence, label, blast_hits_dict.get(label))
         w.writerows(output_single)
     f.close()
     t_end = time.time() ###
@@ -172,7 +198,6 @@ def submain(parameter_csv):
     block_filename = '{}{}_DNA_block_info.csv'.format(dir_worksheet, experiment_id)
     process_file.file(block_filename, param_dict)
     
-    os.system('rm -r -f {}'.format(dir_blast_tmp))
     print('Done!' )
     t_end = time.time() ###
     print('Total time for 2nd part: {}'.format(t_end - t_start)) ###
@@ -191,8 +216,6 @@ def submain_parallel(parameter_csv):
     input_file = param_dict['input_file']
         
     dir_output = param_dict['output_directory']
-    dir_blast = '{}blast_result/'.format(dir_output)
-    dir_blast_tmp = '{}tmp/'.format(dir_blast)
     dir_worksheet = '{}worksheet/'.format(dir_output)
     if not os.path.exists(dir_worksheet):
         os.mkdir(dir_worksheet)
@@ -207,8 +230,13 @@ def submain_parallel(parameter_csv):
         
     ##########
     my_object = OrderMain(parameter_csv)
+    if my_object.blast_batch:
+        print('BLAST for all sequences...')
+        blast_hits_dict = calculate_score.blast_batch(label_list, sequence_list, param_dict)
+    else:
+        blast_hits_dict = dict()
     my_obj_pool = Pool()  #Pool(processes=n), default: number of logical CPU cores, print(my_obj_pool._processes)
-    args = [(sequence_list[k], label_list[k]) for k in range(len(label_list))]
+    args = [(sequence_list[k], label_list[k], blast_hits_dict.get(label_list[k])) for k in range(len(label_list))]
     output_all = my_obj_pool.starmap(my_object.process_target_single, args)
     my_obj_pool.close()
     
@@ -249,7 +277,6 @@ def submain_parallel(parameter_csv):
     block_filename = '{}{}_DNA_block_info.csv'.format(dir_worksheet, experiment_id)
     process_file.file(block_filename, param_dict)
     
-    #os.system('rm -r -f {}'.format(dir_blast_tmp))
     print('Done!' )
     t_end = time.time() ###
     print('Total time for 2nd part: {}'.format(t_end - t_start)) ###
@@ -6,6 +6,7 @@ import pickle
 import psycopg2
 import shutil
 import os
+import multiprocessing
 
 import Twist_APItools as Twist
 import IDT_APItools as IDT
@@ -78,6 +79,18 @@ def write_to_fasta_or_txt(element, filename):
 
 
 
+def fasta_text(element):
+    """
+    A STRING OR A LIST OF STRING IN FASTA FORMAT, AS WRITTEN BY write_to_fasta_or_txt
+    (ids are the indices), e.g. for the stdin of blastn
+    """
+    if type(element) == str:
+        element = [element]
+        
+    return ''.join('>{}\n{}\n'.format(k, element[k]) for k in range(len(element)))
+
+
+
 def write_dict_to_csv(data_dict, filename, option):
     """
     WRITE DICT TO A FILE (csv or xlsx)
@@ -384,3 +397,18 @@ def output_to_worksheet(block_file, filename_pre):
 def my_print(str, option):
     if option:
         print(str)
+        
+        
+        
+def in_daemon_process():
+    """
+    whether this is a daemonic process (e.g. a worker of the multiprocess Pool of
+    order_main.submain_parallel), which is not allowed to start child processes
+    """
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        import multiprocess
+    except ImportError:
+        return False
+    return bool(multiprocess.current_process().daemon)